@@ -13,8 +13,9 @@ import random
 class AnalyticalNeuron:
 
     ## The constructor
-    def __init__(self):
-        return
+    # @param seed Seed of the random generator used to break ties, so that results can be reproduced
+    def __init__(self, seed=None):
+        self._random = random.Random(seed)
 
     ## Solve ambiguities
     # @param rel_knowledge_v Vector of relational knowledge
@@ -29,11 +30,34 @@ class AnalyticalNeuron:
             # If current maximum weight equals weight of element,
             # randomly decide to reassign max_weight_rel
             if element.get_weight() == max_weight_rel.get_weight():
-                if random.randint(0,1) == 1:
+                if self._random.randint(0,1) == 1:
                     max_weight_rel = element
         # Return hearing id of maximum weight relation
         return max_weight_rel.get_h_id()
 
+    ## Solve ambiguities among the relations of several sight ids, using the relations of maximum weight
+    # that the relational network maintains for every sight id. Ties are broken at random
+    # @param rel_network RelNetwork
+    # @param s_ids Integer vector. Sight ids
+    # @retval h_id Integer. Hearing id of a maximum weight relation, None if there are no relations
+    def solve_ambiguity_sight(self, rel_network, s_ids):
+        max_weight = None
+        candidates = []
+        for s_id in s_ids:
+            best_rels = rel_network.get_best_sight_rels(s_id)
+            if len(best_rels) == 0:
+                continue
+            # Weight keys order relations as their weights, even if weights decay as they are read
+            weight = rel_network.get_weight_key(best_rels[0].get_index())
+            if max_weight is None or weight > max_weight:
+                max_weight = weight
+                candidates = best_rels
+            elif weight == max_weight:
+                candidates = candidates + best_rels
+        if len(candidates) == 0:
+            return None
+        return self._random.choice(candidates).get_h_id()
+
 
 ## @}
 #
\ No newline at end of file
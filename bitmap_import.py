@@ -0,0 +1,193 @@
+import os
+
+import numpy as np
+
+from pattern_grid import encode_grids
+from sensory_neural_block import RbfKnowledge
+
+## \defgroup BitmapImport Bitmap import related classes
+#
+# Bitmap import related classes read netpbm (PBM and PGM) images and turn them
+# into sight patterns that can be learned by a SensoryNeuralBlock
+# @{
+#
+
+## Netpbm file extensions that can be imported
+NETPBM_EXTENSIONS = (".pbm", ".pgm")
+
+
+## Read a PBM or PGM image.
+# Plain (P1, P2) and raw (P4, P5) formats are supported. Only the first image of the file is read.
+# @param name Name of the file
+# @retval ink Float matrix with values from 0 (background) to 1 (ink)
+def read_netpbm(name):
+    netpbm_file = open(name, "rb")
+    try:
+        data = netpbm_file.read()
+    finally:
+        netpbm_file.close()
+    magic = data[:2]
+    if magic not in (b"P1", b"P2", b"P4", b"P5"):
+        raise ValueError("%s is not a PBM or PGM file" % name)
+    header_size = 3 if magic in (b"P1", b"P4") else 4
+    tokens, offset = _read_header(data, header_size)
+    width, height = int(tokens[1]), int(tokens[2])
+    if magic == b"P1":
+        # Plain PBM pixels may or may not be separated by whitespace
+        bits = [char for char in data[offset:].decode("ascii") if char in "01"]
+        return np.array(bits[:width*height], dtype=np.float64).reshape(height, width)
+    if magic == b"P4":
+        row_bytes = (width + 7) // 8
+        raw = np.frombuffer(data, dtype=np.uint8, count=row_bytes*height, offset=offset)
+        bits = np.unpackbits(raw.reshape(height, row_bytes), axis=1)[:, :width]
+        return bits.astype(np.float64)
+    max_value = float(tokens[3])
+    if magic == b"P2":
+        values = np.array(data[offset:].split()[:width*height], dtype=np.float64)
+    else:
+        dtype = np.uint8 if max_value < 256 else np.dtype(">u2")
+        values = np.frombuffer(data, dtype=dtype, count=width*height, offset=offset).astype(np.float64)
+    # In graymaps, zero is black (ink)
+    return 1 - values.reshape(height, width) / max_value
+
+
+## Downsample (or upsample) an ink image to a square grid of cells.
+# Every cell covers a rectangular area of the image; the cell is active if the mean ink in the area
+# reaches the coverage threshold
+# @param ink Float matrix with values from 0 to 1
+# @param grid_size Integer. Number of cells per side of the grid
+# @param threshold Float. Minimum ink for a pixel to be considered part of the glyph
+# @param coverage Float. Minimum fraction of pixels with ink for a cell to be active
+# @retval grid Boolean matrix of shape (grid_size, grid_size)
+def ink_to_grid(ink, grid_size, threshold=0.5, coverage=0.25):
+    marked = (np.asarray(ink) >= threshold).astype(np.float64)
+    height, width = marked.shape
+    # Integral image, so that the sum over any cell is computed with four lookups
+    integral = np.zeros((height + 1, width + 1))
+    integral[1:, 1:] = marked.cumsum(axis=0).cumsum(axis=1)
+    rows_start, rows_end = _cell_bounds(height, grid_size)
+    cols_start, cols_end = _cell_bounds(width, grid_size)
+    sums = (integral[rows_end][:, cols_end] - integral[rows_start][:, cols_end]
+            - integral[rows_end][:, cols_start] + integral[rows_start][:, cols_start])
+    areas = np.outer(rows_end - rows_start, cols_end - cols_start)
+    return sums / areas >= coverage
+
+
+## Bitmap importer.
+# Reads directories of netpbm bitmaps, turns them into grids of the kernel's size and encodes
+# them in one vectorized pass to the nibble format used by sight RbfKnowledge patterns
+class BitmapImporter:
+
+    ## Default number of cells per side of the grid
+    GRID_SIZE = 16
+
+    ## The constructor
+    # @param grid_size Integer. Number of cells per side of the grid
+    # @param threshold Float. Minimum ink for a pixel to be considered part of the glyph
+    # @param coverage Float. Minimum fraction of pixels with ink for a cell to be active
+    def __init__(self, grid_size=GRID_SIZE, threshold=0.5, coverage=0.25):
+        self.grid_size = grid_size
+        self.threshold = threshold
+        self.coverage = coverage
+
+    ## Import every bitmap in a directory (and its subdirectories)
+    # The class of every glyph is the name of its file up to the first underscore or dot, so that
+    # "a_01.pbm" and "a_02.pbm" are both of class "a"
+    # @param directory Name of the directory
+    # @retval patterns, classes Integer array of shape (count, pattern_size) and list of classes
+    def import_directory(self, directory):
+        names = []
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in NETPBM_EXTENSIONS:
+                    names.append(os.path.join(root, name))
+        classes = [BitmapImporter.get_class_name(name) for name in names]
+        return self.import_files(names), classes
+
+    ## Import a list of bitmaps
+    # @param names List of file names
+    # @retval patterns Integer array of shape (count, pattern_size)
+    def import_files(self, names):
+        grids = np.zeros((len(names), self.grid_size, self.grid_size), dtype=bool)
+        for index in range(len(names)):
+            grids[index] = ink_to_grid(read_netpbm(names[index]), self.grid_size, self.threshold, self.coverage)
+        return encode_grids(grids)
+
+    ## Learn imported patterns in the sight network of a SensoryNeuralBlock
+    # @param snb SensoryNeuralBlock
+    # @param patterns Integer array of shape (count, pattern_size)
+    # @param classes List of classes, one per pattern
+    # @retval learned Integer. Number of patterns successfully learned
+    @staticmethod
+    def learn_sight(snb, patterns, classes):
+        learned = 0
+        for pattern, rbf_class in zip(patterns.tolist(), classes):
+            if snb.learn_sight(RbfKnowledge(pattern, rbf_class)):
+                learned += 1
+        return learned
+
+    ## Get glyph class from file name
+    # @param name File name
+    @staticmethod
+    def get_class_name(name):
+        base_name = os.path.basename(name)
+        return base_name.split(".")[0].split("_")[0]
+
+
+def _read_header(data, token_count):
+    tokens = []
+    offset = 0
+    while len(tokens) < token_count:
+        # Skip whitespace and comments
+        while data[offset:offset+1].isspace() or data[offset:offset+1] == b"#":
+            if data[offset:offset+1] == b"#":
+                offset = data.index(b"\n", offset)
+            offset += 1
+        start = offset
+        while not data[offset:offset+1].isspace():
+            offset += 1
+        tokens.append(data[start:offset])
+    # A single whitespace character separates the header from raw pixels
+    return tokens, offset + 1
+
+
+def _cell_bounds(length, grid_size):
+    start = (np.arange(grid_size) * length) // grid_size
+    end = np.maximum((np.arange(1, grid_size + 1) * length) // grid_size, start + 1)
+    return start, end
+
+## @}
+#
+
+# Tests
+if __name__ == '__main__':
+
+    import tempfile
+    import time
+
+    from sensory_neural_block import SensoryNeuralBlock, RbfConfig
+
+    directory = tempfile.mkdtemp()
+    # A 32x32 vertical bar as raw PBM and a 16x16 horizontal bar as plain PGM
+    bar = np.zeros((32, 32), dtype=np.uint8)
+    bar[4:28, 14:18] = 1
+    pbm_file = open(os.path.join(directory, "i_01.pbm"), "wb")
+    pbm_file.write(b"P4\n# vertical bar\n32 32\n" + np.packbits(bar, axis=1).tostring())
+    pbm_file.close()
+    dash = np.full((16, 16), 255, dtype=np.uint8)
+    dash[7:9, 2:14] = 0
+    pgm_file = open(os.path.join(directory, "dash_01.pgm"), "w")
+    pgm_file.write("P2\n16 16\n255\n" + " ".join(str(value) for value in dash.ravel()) + "\n")
+    pgm_file.close()
+
+    importer = BitmapImporter()
+    start = time.time()
+    patterns, classes = importer.import_directory(directory)
+    print "Imported ", len(classes), " bitmaps in ", time.time() - start, " seconds"
+    for pattern, rbf_class in zip(patterns, classes):
+        print rbf_class, pattern.tolist()
+
+    snb = SensoryNeuralBlock(config=RbfConfig.for_grid(16, 24))
+    print "Learned ", BitmapImporter.learn_sight(snb, patterns, classes)
+    print "Recognize 'i': ", snb.recognize_sight(patterns[classes.index("i")].tolist())
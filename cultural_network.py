@@ -1,6 +1,6 @@
 import pickle
 
-from neuron import Neuron
+from neuron import Neuron, load_pickle
 
 ## \defgroup CultBlocks Cultural network related classes
 #
@@ -11,7 +11,7 @@ from neuron import Neuron
 
 ## Cultural neuron
 class CulturalNeuron(Neuron):
-    pass
+    __slots__ = ()
 
 ## Cultural group
 class CulturalGroup:
@@ -81,9 +81,26 @@ class CulturalGroup:
         self._index_bip = 0
 
 
+## Node of the prefix trie of a CulturalNetwork
+class _TrieNode(object):
+    __slots__ = ("children", "group_id")
+
+    def __init__(self):
+        ## @var children Dictionary. Piece of knowledge -> _TrieNode
+        self.children = {}
+        ## @var group_id Id of the group whose sequence ends in this node, None if there is none
+        self.group_id = None
+
+
 ## Cultural network
 #
-# Set of CulturalGroup instances
+# Set of CulturalGroup instances. A group stores a sequence of pieces of knowledge followed by its tail
+# knowledge, and the bbcc protocol recognizes the group whose sequence is the one given by bip and check.
+# Sequences of learned groups are kept in a prefix trie whose edges are pieces of knowledge, so bum, bip and
+# check move a cursor one node down the trie, in constant time whatever the number of groups. Whole sequences can
+# also be recognized and learned in a single call (see recognize_sequence and learn_sequence). Pieces of knowledge
+# must be hashable (lists are accepted and compared as tuples). The trie is not serialized but rebuilt from the
+# groups when the network is deserialized.
 class CulturalNetwork:
 
     ## CulturalNetwork class constructor
@@ -93,8 +110,50 @@ class CulturalNetwork:
             self.group_list.append(CulturalGroup())
         self._index_ready_to_learn = 0
         self._clack = False
-        self._recognized_indexes = []
-
+        self._build_indexes()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_trie"]
+        del state["_cursor"]
+        del state["_in_sequence"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Networks serialized before the trie kept the indexes of the groups that recognized the sequence
+        self.__dict__.pop("_recognized_indexes", None)
+        self._build_indexes()
+
+    ## Build the indexes of learned groups: the prefix trie of their sequences
+    def _build_indexes(self):
+        self._trie = _TrieNode()
+        # Node of the sequence given since the last bum, None if no learned sequence starts with it
+        self._cursor = None
+        # Whether a sequence is being given, that is, bum has been called and check has not
+        self._in_sequence = False
+        for group_id in range(self._index_ready_to_learn):
+            self._index_group(group_id)
+
+    ## Add a group that has just been learned to the indexes
+    # @param group_id Integer
+    def _index_group(self, group_id):
+        self._add_to_trie(group_id)
+
+    ## Add the sequence of a learned group to the trie. If another group has the same sequence, the first one
+    # keeps being recognized
+    # @param group_id Integer
+    def _add_to_trie(self, group_id):
+        node = self._trie
+        # The last neuron of the group stores the tail knowledge
+        for neuron in self.group_list[group_id].group[:-1]:
+            key = get_knowledge_key(neuron.get_knowledge())
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = _TrieNode()
+            node = child
+        if node.group_id is None:
+            node.group_id = group_id
 
     ## Start of bbcc protocol
     def bum(self):
@@ -103,54 +162,38 @@ class CulturalNetwork:
             self.resize()
         # Renintialize ready lo learn group
         self.group_list[self._index_ready_to_learn].reinit()
-        # Reinitialize vector of recognized indexes
-        self._recognized_indexes = []
-        # Pass bum signal to all cultural groups with knowledge
-        for group_index in range(self._index_ready_to_learn):
-            self.group_list[group_index].bum()
-            # Initialize a list of participating neurons
-            # At this stage, all neurons with knowledge may recognize the sequence
-            self._recognized_indexes.append(group_index)
+        # At this stage, all groups with knowledge may recognize the sequence
+        self._cursor = self._trie
+        self._in_sequence = True
 
     ## Pass an instance of knowledge to be compared or stored
     # @param knowledge
     def bip(self, knowledge):
-        # Indexes of neural groups that recognized bip
-        bip_indexes = []
-        # Pass bip signal to all neurons that have recognized the given sequence
-        # and store the indexes of all neurons that have recognized until now
-        for group_index in self._recognized_indexes:
-            if self.group_list[group_index].bip(knowledge):
-                bip_indexes.append(group_index)
-        # Store bip_indexes in instance attribute _recognized_indexes
-        self._recognized_indexes = bip_indexes
+        # Follow the sequence given until now in the trie
+        if self._cursor is not None:
+            self._cursor = self._cursor.children.get(get_knowledge_key(knowledge))
         # Learn in ready to learn neuron
         self.group_list[self._index_ready_to_learn].learn(knowledge)
 
     ## Pass the second-to-last instance of knowledge to be compared or stored
     # @param knowledge
     def check(self, knowledge):
-        # Indexes
-        check_indexes = []
-        for group_index in self._recognized_indexes:
-            if self.group_list[group_index].check(knowledge):
-                check_indexes.append(group_index)
-        self._recognized_indexes = check_indexes
+        node = None
+        if self._cursor is not None:
+            node = self._cursor.children.get(get_knowledge_key(knowledge))
+        self._cursor = None
+        self._in_sequence = False
         # If no group has the knowledge related to the given sequence, keep learning
-        if len(check_indexes) == 0:
+        if node is None or node.group_id is None:
             # Learn
             self.group_list[self._index_ready_to_learn].learn(knowledge)
             # Enable clack
             self._clack = True
             return None
-        # Exactly one cultural group must have recognized the sequence, return index of that group
-        elif len(check_indexes) == 1:
-            # Do not learn
-            self.group_list[self._index_ready_to_learn].reinit()
-            # Return index of cultural group that has recognized the process
-            return check_indexes[0]
-        else:
-            raise AttributeError("CulturalNet net has an inconsistent state")
+        # Do not learn
+        self.group_list[self._index_ready_to_learn].reinit()
+        # Return index of cultural group that has recognized the process
+        return node.group_id
 
     ## earn tail knowledge of cultural group
     # @param knowledge Tail knowledge
@@ -159,14 +202,72 @@ class CulturalNetwork:
             return
         # Learn
         self.group_list[self._index_ready_to_learn].clack(knowledge)
+        self._index_group(self._index_ready_to_learn)
         self._clack = False
         self._index_ready_to_learn += 1
 
-    ## Resize network
+    ## Get id of the group whose sequence is the given one, without learning it and without changing the state
+    # of the bbcc protocol. It is the group that bum, bip for all pieces of knowledge but the last one and check
+    # for the last one would recognize
+    # @param items Vector of pieces of knowledge
+    # @retval group_id Integer, None if no group has that sequence
+    def recognize_sequence(self, items):
+        node = self._trie
+        for knowledge in items:
+            node = node.children.get(get_knowledge_key(knowledge))
+            if node is None:
+                return None
+        # Sequences have at least one piece of knowledge
+        if node is self._trie:
+            return None
+        return node.group_id
+
+    ## Learn a sequence and its tail knowledge in a single call, as bum, bip, check and clack would, unless some
+    # group already has that sequence. The state of the bbcc protocol is left as it was, so a sequence being given
+    # piece by piece can be completed afterwards, and check recognizes the new group if its sequence is the one
+    # given since the last bum
+    # @param items Vector of pieces of knowledge, at least one
+    # @param tail Tail knowledge
+    # @retval group_id Integer. Id of the new group, or of the group that already had the sequence
+    def learn_sequence(self, items, tail):
+        items = list(items)
+        if len(items) == 0:
+            raise ValueError("a sequence needs at least one piece of knowledge")
+        group_id = self.recognize_sequence(items)
+        if group_id is not None:
+            return group_id
+        group = CulturalGroup()
+        for knowledge in items:
+            group.learn(knowledge)
+        group.clack(tail)
+        group_id = self._index_ready_to_learn
+        # There must be room for the new group and for the ready to learn one after it
+        while group_id + 1 >= len(self.group_list):
+            self.resize()
+        # The group being learned through the bbcc protocol, if any, stays ready to learn
+        self.group_list[group_id + 1] = self.group_list[group_id]
+        self.group_list[group_id] = group
+        self._index_group(group_id)
+        self._index_ready_to_learn += 1
+        if self._in_sequence:
+            self._sync_cursor()
+        return group_id
+
+    ## Move the cursor to the node of the sequence given since the last bum. The node may not have been in the
+    # trie when the sequence was given, if a group with that prefix was learned afterwards by learn_sequence
+    def _sync_cursor(self):
+        node = self._trie
+        for neuron in self.group_list[self._index_ready_to_learn].group:
+            node = node.children.get(get_knowledge_key(neuron.get_knowledge()))
+            if node is None:
+                break
+        self._cursor = node
+
+    ## Resize network, doubling its number of groups (or adding one if it has none)
     def resize(self):
         new_list = []
         # Fill neuron list with memories
-        for index in range(len(self.group_list)):
+        for index in range(max(len(self.group_list), 1)):
             new_list.append(CulturalGroup())
         self.group_list = self.group_list + new_list
 
@@ -192,7 +293,15 @@ class CulturalNetwork:
     # @param cls CulturalNetwork class
     # @param name Name of the file where the object is serialize
     def deserialize(cls, name):
-        return pickle.load(open(name, "rb"))
+        return load_pickle(open(name, "rb"))
+
+
+## Return the key of a piece of knowledge in the dictionaries that index cultural networks. Lists are not
+# hashable, so they are converted to tuples
+def get_knowledge_key(knowledge):
+    if isinstance(knowledge, list):
+        return tuple(get_knowledge_key(element) for element in knowledge)
+    return knowledge
 
 ## @}
 #
@@ -217,6 +326,22 @@ if __name__ == '__main__':
     net.check("o")
     net.clack("llo")
 
+    # Whole sequences
+    print "Group of 'llo': ", net.recognize_sequence(["l", "l", "o"])
+    print "Group of 'lo': ", net.recognize_sequence(["l", "o"])
+    print "Learned 'lo' in group: ", net.learn_sequence(["l", "o"], "lo")
+    print "Tail of 'lo': ", net.get_tail_knowledge(net.recognize_sequence(["l", "o"]))
+
+    # A sequence learned while another one is being given is recognized by check
+    net.bum()
+    net.bip("m")
+    net.learn_sequence(["m", "e"], "me")
+    print "Check of 'me' after learning it: ", net.check("e")
+
+    # Networks without groups grow as needed
+    empty = CulturalNetwork(0)
+    print "Learned 'x' in empty network in group: ", empty.learn_sequence(["x"], "x")
+
     i = 1
 
 
@@ -1,6 +1,9 @@
+import heapq
+import itertools
 import pickle
 
-from cultural_network import CulturalNetwork,CulturalGroup,CulturalNeuron
+from cultural_network import CulturalNetwork,CulturalGroup,CulturalNeuron,get_knowledge_key
+from neuron import load_pickle
 
 ## \addtogroup Intentions
 #  Episodic memories block
@@ -9,40 +12,114 @@ from cultural_network import CulturalNetwork,CulturalGroup,CulturalNeuron
 ## The EpisodicMemoriesBlock is a specialization of CulturalNetwork
 # from which a set of CulturalGroup s can be retrieved given a set of triggers, just
 # as in humans. An exact memory can also be retrieved.
+#
+# Memories are retrieved through an inverted index that maps every piece of knowledge of the
+# sequence of a memory (its tail, the BCF, is not indexed) to the ids of the memories that
+# contain it. The index is updated when a memory is learned and rebuilt when the block is
+# deserialized.
 class EpisodicMemoriesBlock(CulturalNetwork):
 
     ## The constructor
     def __init__(self):
         CulturalNetwork.__init__(self)
 
+    def __getstate__(self):
+        state = CulturalNetwork.__getstate__(self)
+        del state["_postings"]
+        return state
+
+    def _build_indexes(self):
+        # Piece of knowledge -> ids of the memories that contain it, in increasing order
+        self._postings = {}
+        CulturalNetwork._build_indexes(self)
+
+    def _index_group(self, group_id):
+        CulturalNetwork._index_group(self, group_id)
+        for neuron in self.group_list[group_id].group[:-1]:
+            posting = self._postings.setdefault(get_knowledge_key(neuron.get_knowledge()), [])
+            # A memory may contain the same knowledge several times
+            if len(posting) == 0 or posting[-1] != group_id:
+                posting.append(group_id)
+
+    ## Return ids of the memories that contain the given memory triggers
+    # @param trigger_list Vector of pieces of knowledge
+    # @param require_all Boolean. If False, memories that contain any trigger are returned; if True, only
+    #    memories that contain all of them
+    # @retval memory_ids Integer vector, without repetitions, in the order memories were learned
+    def retrieve_memory_ids(self, trigger_list, require_all=False):
+        postings = [self._postings.get(get_knowledge_key(trigger), []) for trigger in trigger_list]
+        if len(postings) == 0:
+            return []
+        if not require_all:
+            return sorted(set().union(*postings))
+        # Intersect starting from the shortest posting list
+        postings.sort(key=len)
+        memory_ids = set(postings[0])
+        for posting in postings[1:]:
+            if len(memory_ids) == 0:
+                break
+            memory_ids.intersection_update(posting)
+        return sorted(memory_ids)
+
     ## Return a list of memories (Cultural Groups) that contain the list of given
     # memory triggers
-    # @retval retrieved_memories CulturalGroup vector.
-    def retrieve_memories(self, trigger_list):
-        # List of retrieved memories, initialized as and empty list
-        retrieved_memories = []
-
-        # For every trigger
-        for trigger in trigger_list:
-            # For every group (memory) in list of memories
-            for group in self.group_list:
-                # If the memory contains the given trigger
-                if group.contains(trigger):
-                    # Append the memory to list of retrieved memories
-                    retrieved_memories.append(group)
-
-        return retrieved_memories
-
-    ##  Return the exact memory (except for last element in trigger)
-    # @retval memory CulturalGroup
-    def retrieve_exact_memory(self, trigger ):
-        # Use bbcc protocol
-        self.bum()
-        for index in range(len(trigger)):
-            if index != len(trigger)-1:
-                self.bip(trigger[index])
-            else:
-                return self.group_list[self.check(trigger[index])]
+    # @param trigger_list Vector of pieces of knowledge
+    # @param require_all Boolean. If False, memories that contain any trigger are returned; if True, only
+    #    memories that contain all of them
+    # @retval retrieved_memories CulturalGroup vector, without repetitions, in the order memories were learned
+    def retrieve_memories(self, trigger_list, require_all=False):
+        return [self.group_list[memory_id] for memory_id in self.retrieve_memory_ids(trigger_list, require_all)]
+
+    ## Return ids of the k memories that best match the given memory triggers. A memory scores one point per
+    # trigger it contains, plus recency_weight times its recency (0 for the first memory learned, 1 for the
+    # last one), minus distance_weight times the Manhattan distance between its BCF and the given state. Only
+    # memories that contain some trigger are scored: the posting lists of the triggers are merged in order of
+    # memory id, so every memory is scored once with all its triggers, and a heap of size k keeps the best ones
+    # @param trigger_list Vector of pieces of knowledge
+    # @param k Integer. Maximum number of memories
+    # @param recency_weight Float
+    # @param state BCF vector or BiologyCultureFeelings compared with the BCF of memories, None for no distance term
+    # @param distance_weight Float
+    # @retval memory_ids Integer vector, from the best score to the worst one. Ties are broken in favour of
+    #    the memory learned first
+    def retrieve_top_memory_ids(self, trigger_list, k, recency_weight=0.0, state=None, distance_weight=0.0):
+        if k <= 0:
+            return []
+        postings = [self._postings[key] for key in set(get_knowledge_key(trigger) for trigger in trigger_list)
+                    if key in self._postings]
+        recency_scale = recency_weight / float(max(self._index_ready_to_learn - 1, 1))
+        if state is not None:
+            state = _get_bcf(state)
+        # Heap of the best (score, -memory_id) pairs so far, the worst one first
+        best = []
+        for memory_id, occurrences in itertools.groupby(heapq.merge(*postings)):
+            score = sum(1 for occurrence in occurrences) + recency_scale * memory_id
+            if state is not None and distance_weight != 0:
+                bcf = _get_bcf(self.group_list[memory_id].get_tail_knowledge())
+                score -= distance_weight * sum(abs(a - b) for a, b in zip(bcf, state))
+            if len(best) < k:
+                heapq.heappush(best, (score, -memory_id))
+            elif (score, -memory_id) > best[0]:
+                heapq.heapreplace(best, (score, -memory_id))
+        return [-memory_id for score, memory_id in sorted(best, reverse=True)]
+
+    ## Return the k memories (Cultural Groups) that best match the given memory triggers
+    # (see retrieve_top_memory_ids)
+    # @retval retrieved_memories CulturalGroup vector, from the best score to the worst one
+    def retrieve_top_memories(self, trigger_list, k, recency_weight=0.0, state=None, distance_weight=0.0):
+        return [self.group_list[memory_id] for memory_id in
+                self.retrieve_top_memory_ids(trigger_list, k, recency_weight, state, distance_weight)]
+
+    ##  Return the exact memory whose sequence is the given trigger (the memory except for its tail). The memory is
+    # looked up in the trie of sequences, so the block is not changed: neither the bbcc protocol nor the ready to
+    # learn group are touched
+    # @param trigger Vector of pieces of knowledge
+    # @retval memory CulturalGroup, None if no memory has that sequence
+    def retrieve_exact_memory(self, trigger):
+        memory_id = self.recognize_sequence(trigger)
+        if memory_id is None:
+            return None
+        return self.group_list[memory_id]
 
 
     @classmethod
@@ -58,7 +135,14 @@ class EpisodicMemoriesBlock(CulturalNetwork):
     # @param cls EpisodicMemory class
     # @param name Name of the file where the object is serialized
     def deserialize(cls, name):
-        return pickle.load(open(name, "rb"))
+        return load_pickle(open(name, "rb"))
+
+
+## Return the BCF vector of a BiologyCultureFeelings instance or of a vector
+def _get_bcf(bcf):
+    if hasattr(bcf, "get_state"):
+        return bcf.get_state()
+    return bcf
 
 ## @}
 #
@@ -109,10 +193,30 @@ if __name__ == '__main__':
             for episode in memory.group:
                 print episode.get_knowledge()
 
-    print "Retrieving memories related to 'board and eraser'"
+    print "Retrieving memories related to 'board' or 'eraser'"
     if len(em.retrieve_memories(['board', 'eraser'])) == 0:
         print "No memories found"
     else:
         for memory in em.retrieve_memories(['board', 'eraser']):
             for episode in memory.group:
-                print episode.get_knowledge()
\ No newline at end of file
+                print episode.get_knowledge()
+    print "Retrieving memories related to 'board' and 'eraser'"
+    for memory in em.retrieve_memories(['board', 'eraser'], require_all=True):
+        for episode in memory.group:
+            print episode.get_knowledge()
+
+    print "Two best memories for 'board' and 'eraser', the most recent first among ties: "
+    for memory in em.retrieve_top_memories(['board', 'eraser'], 2, recency_weight=0.5):
+        print [episode.get_knowledge() for episode in memory.group]
+    print "Best memory for 'board', the closest to [0.4, 0.7, 0.4]: "
+    for memory in em.retrieve_top_memories(['board'], 1, state=[0.4, 0.7, 0.4], distance_weight=1.0):
+        print [episode.get_knowledge() for episode in memory.group]
+
+    print "Exact memory of 'pencil, eraser, sharpener': ", \
+        em.retrieve_exact_memory(['pencil', 'eraser', 'sharpener']).get_tail_knowledge()
+    print "Exact memory of 'pencil': ", em.retrieve_exact_memory(['pencil'])
+
+    # Whole memories
+    print "Memory of 'board, notebook, pupils': ", em.recognize_sequence(['board', 'notebook', 'pupils'])
+    memory_id = em.learn_sequence(['pencil', 'board', 'pupils'], [0.3, 0.8, 0.5])
+    print "New memory: ", memory_id, em.get_tail_knowledge(memory_id)
@@ -1,6 +1,6 @@
 import pickle
 
-from neuron import Neuron
+from neuron import Neuron, load_pickle
 
 ## \defgroup GeometricNeuralBlock Geometric Neural Block classes
 #
@@ -15,13 +15,13 @@ from neuron import Neuron
 ## The QuantityNeuron class is a kind of neuron
 # that signals the cardinality of its relation in a QuantityOrderGroup
 class QuantityNeuron(Neuron):
-    pass
+    __slots__ = ()
 
 ## The QuantityNeuron class is a kind of neuron
 # whose position in a QuantityOrderNetwork
 # signals certain ordinality.
 class OrderNeuron(Neuron):
-    pass
+    __slots__ = ()
 
 ## A QuantityOrderGroup is a pair composed of an OrderNeuron and a QuantityNeuron.
 # It is the basic element of a QuantityOrderNetwork.
@@ -366,7 +366,7 @@ class GeometricNeuralBlock:
     # @param cls GeometricNeuralBlock class
     # @param name Name of the file where the object is serialized
     def deserialize(cls, name):
-        return pickle.load(open(name, "rb"))
+        return load_pickle(open(name, "rb"))
 
 ## @}
 #
@@ -0,0 +1,269 @@
+import time
+import wave
+
+import numpy as np
+
+from sensory_neural_block import RbfKnowledge
+
+## \defgroup HearingIngestion Hearing ingestion related classes
+#
+# Hearing ingestion related classes read audio recordings and turn them into
+# hearing patterns that can be recognized or learned by a SensoryNeuralBlock
+# @{
+#
+
+
+## Read a WAV file frame by frame.
+# Samples are read in chunks, mixed down to a single channel and scaled to the
+# real interval [-1, 1], so that memory use does not depend on the recording length
+class WavFrameReader:
+
+    ## Number of frames read from the file on every access to disk
+    FRAMES_PER_CHUNK = 64
+
+    ## The constructor
+    # @param name Name of the WAV file
+    # @param frame_size Integer. Number of samples per frame
+    def __init__(self, name, frame_size=512):
+        self.name = name
+        self.frame_size = frame_size
+        self.sample_rate = None
+        self.channels = None
+        self.sample_width = None
+        self.sample_count = None
+
+    ## Return a generator of frames. Every frame is a float vector of size frame_size.
+    # The last incomplete frame of the recording is discarded
+    def frames(self):
+        wav_file = wave.open(self.name, "rb")
+        try:
+            self.sample_rate = wav_file.getframerate()
+            self.channels = wav_file.getnchannels()
+            self.sample_width = wav_file.getsampwidth()
+            self.sample_count = wav_file.getnframes()
+            chunk_size = self.frame_size * WavFrameReader.FRAMES_PER_CHUNK
+            # Samples from the previous chunk that did not complete a frame
+            pending = np.zeros(0)
+            while True:
+                data = wav_file.readframes(chunk_size)
+                if len(data) == 0:
+                    break
+                samples = np.concatenate((pending, self._decode(data)))
+                frame_count = len(samples) // self.frame_size
+                for index in range(frame_count):
+                    yield samples[index*self.frame_size:(index+1)*self.frame_size]
+                pending = samples[frame_count*self.frame_size:]
+        finally:
+            wav_file.close()
+
+    ## Get duration of the recording in seconds
+    # @retval duration Float. None if the file has not been opened yet
+    def get_duration(self):
+        if self.sample_count is None:
+            return None
+        return self.sample_count / float(self.sample_rate)
+
+    ## Decode raw bytes into mono samples in the interval [-1, 1]
+    # @param data String of raw bytes read from the WAV file
+    def _decode(self, data):
+        width = self.sample_width
+        if width == 1:
+            # 8 bits samples are unsigned
+            samples = np.frombuffer(data, dtype=np.uint8).astype(np.float64) - 128
+        elif width == 2:
+            samples = np.frombuffer(data, dtype="<i2").astype(np.float64)
+        elif width == 3:
+            raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+            # Sign extension of 24 bits samples
+            samples = np.where(samples >= 1 << 23, samples - (1 << 24), samples).astype(np.float64)
+        elif width == 4:
+            samples = np.frombuffer(data, dtype="<i4").astype(np.float64)
+        else:
+            raise ValueError("unsupported sample width")
+        samples /= float(1 << (8*width - 1))
+        # Mix down all channels
+        return samples.reshape(-1, self.channels).mean(axis=1)
+
+
+## Compute band energies of a block of frames.
+# Bands are geometrically spaced over the spectrum (the lowest frequency bin is discarded),
+# which resembles the frequency resolution of human hearing
+# @param frames Float matrix of shape (frame_count, frame_size)
+# @param band_count Integer. Number of frequency bands
+# @retval energies Float matrix of shape (frame_count, band_count)
+def calc_band_energies(frames, band_count):
+    frames = np.asarray(frames, dtype=np.float64)
+    window = np.hanning(frames.shape[1])
+    power = np.abs(np.fft.rfft(frames*window, axis=1)) ** 2
+    edges = calc_band_edges(power.shape[1], band_count)
+    return np.add.reduceat(power, edges[:-1], axis=1)
+
+
+## Compute the edges of geometrically spaced frequency bands (see calc_band_energies).
+# Every band is at least one bin wide, so the lowest bands, which would be narrower than a bin,
+# are one bin wide each and the remaining ones are spaced geometrically. Spectra with fewer bins
+# than bands get linearly spaced edges
+# @param bin_count Integer. Number of frequency bins
+# @param band_count Integer. Number of frequency bands
+# @retval edges Integers vector of size band_count + 1. Band i spans bins edges[i] to edges[i+1] - 1
+def calc_band_edges(bin_count, band_count):
+    if bin_count - 1 < band_count:
+        return np.linspace(1, bin_count, band_count + 1).astype(int)
+    edges = np.geomspace(1, bin_count, band_count + 1).round().astype(int)
+    for index in range(1, band_count + 1):
+        # At least one bin per band, leaving one bin for each of the following bands
+        edges[index] = min(max(edges[index], edges[index - 1] + 1), bin_count - (band_count - index))
+    return edges
+
+
+## Quantize band energies into a pattern of nibbles (integers from 0 to 15)
+# Energies are measured in decibels relative to the loudest band of the block; everything below
+# the dynamic range is set to zero
+# @param energies Float matrix of shape (frame_count, band_count)
+# @param dynamic_range Float. Dynamic range in decibels
+# @param silence_energy Float. Blocks whose loudest band is below this energy are quantized to a null pattern
+# @retval pattern Integers list of size frame_count*band_count
+def quantize_energies(energies, dynamic_range=60.0, silence_energy=1e-6):
+    energies = np.asarray(energies, dtype=np.float64).ravel()
+    peak = energies.max()
+    if peak < silence_energy:
+        return [0] * len(energies)
+    decibels = 10 * np.log10(np.maximum(energies, peak * 1e-12) / peak)
+    levels = np.floor((decibels + dynamic_range) / dynamic_range * 16)
+    return np.clip(levels, 0, 15).astype(int).tolist()
+
+
+## Hearing ingestion pipeline.
+# A recording is split into frames, every block of FRAMES_PER_PATTERN frames is turned into
+# band energies and quantized to the nibble format of RbfKnowledge patterns, and the resulting
+# patterns are streamed through the hearing network of a SensoryNeuralBlock
+class HearingIngestion:
+
+    ## Number of frames per hearing pattern
+    FRAMES_PER_PATTERN = 4
+    ## Number of frequency bands per frame
+    BAND_COUNT = 16
+
+    ## The constructor
+    # @param snb SensoryNeuralBlock
+    # @param frame_size Integer. Number of samples per frame
+    # @param dynamic_range Float. Dynamic range of patterns in decibels
+    def __init__(self, snb, frame_size=512, dynamic_range=60.0):
+        self.snb = snb
+        self.frame_size = frame_size
+        self.dynamic_range = dynamic_range
+        self._reset_stats()
+
+    ## Return a generator of hearing patterns computed from a WAV file
+    # @param name Name of the WAV file
+    def patterns(self, name):
+        self._reset_stats()
+        reader = WavFrameReader(name, self.frame_size)
+        start = time.time()
+        block = []
+        for frame in reader.frames():
+            block.append(frame)
+            self._stats["frames"] += 1
+            if len(block) == HearingIngestion.FRAMES_PER_PATTERN:
+                energies = calc_band_energies(block, HearingIngestion.BAND_COUNT)
+                block = []
+                self._stats["patterns"] += 1
+                self._stats["seconds"] = time.time() - start
+                yield quantize_energies(energies, self.dynamic_range)
+        self._stats["audio_seconds"] = reader.get_duration()
+        self._stats["seconds"] = time.time() - start
+
+    ## Recognize every non-null pattern of a WAV file
+    # @param name Name of the WAV file
+    # @retval results Generator of 2-tuples (state, knowledge) where state is "HIT", "MISS" or "DIFF" and knowledge is
+    # the recognized RbfKnowledge if state is "HIT" and None in any other case
+    def recognize_file(self, name):
+        for pattern in self.patterns(name):
+            if HearingIngestion.is_null_pattern(pattern):
+                continue
+            state = self.snb.recognize_hearing(pattern)
+            if state == "HIT":
+                yield state, self.snb.snb_h.get_knowledge()
+            else:
+                yield state, None
+
+    ## Learn every non-null pattern of a WAV file as knowledge of the given class
+    # @param name Name of the WAV file
+    # @param rbf_class Class of the hearing knowledge to be learned
+    # @retval learned Integer. Number of successfully learned patterns
+    def learn_file(self, name, rbf_class):
+        learned = 0
+        for pattern in self.patterns(name):
+            if HearingIngestion.is_null_pattern(pattern):
+                continue
+            if self.snb.learn_hearing(RbfKnowledge(pattern, rbf_class)):
+                learned += 1
+        return learned
+
+    ## Get throughput statistics of the last processed file
+    # @retval stats Dictionary with the number of frames and patterns processed, elapsed and audio seconds,
+    # patterns per second and real time factor (audio seconds processed per elapsed second)
+    def get_stats(self):
+        stats = dict(self._stats)
+        elapsed = stats["seconds"]
+        if elapsed > 0:
+            stats["patterns_per_second"] = stats["patterns"] / elapsed
+            if stats["audio_seconds"] is not None:
+                stats["realtime_factor"] = stats["audio_seconds"] / elapsed
+        return stats
+
+    @staticmethod
+    def is_null_pattern(pattern):
+        for element in pattern:
+            if element != 0:
+                return False
+        return True
+
+    def _reset_stats(self):
+        self._stats = {"frames": 0, "patterns": 0, "seconds": 0.0, "audio_seconds": None,
+                       "patterns_per_second": 0.0, "realtime_factor": None}
+
+## @}
+#
+
+# Tests
+if __name__ == '__main__':
+
+    import os
+    import tempfile
+
+    from sensory_neural_block import SensoryNeuralBlock, RbfConfig
+
+    # Write one second of a 440 Hz tone and one second of a 2 kHz tone
+    def write_tone(name, frequency):
+        rate = 16000
+        t = np.arange(rate) / float(rate)
+        samples = (0.5 * np.sin(2 * np.pi * frequency * t) * 32767).astype("<i2")
+        wav_file = wave.open(name, "wb")
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.tostring())
+        wav_file.close()
+
+    # Bands widen with frequency for the frame sizes in use
+    for frame_size in (256, 512, 1024, 4096):
+        widths = np.diff(calc_band_edges(frame_size // 2 + 1, HearingIngestion.BAND_COUNT))
+        print "Band widths of %d-sample frames grow: " % frame_size, \
+            bool(widths.min() >= 1 and np.all(np.diff(widths) >= 0) and widths[-1] > widths[0])
+
+    directory = tempfile.mkdtemp()
+    low = os.path.join(directory, "low.wav")
+    high = os.path.join(directory, "high.wav")
+    write_tone(low, 440)
+    write_tone(high, 2000)
+
+    # Hearing patterns are 64 nibbles long, just as in the kernel
+    snb = SensoryNeuralBlock(config=RbfConfig(64, 24))
+    ingestion = HearingIngestion(snb)
+    print "Learned low tone patterns: ", ingestion.learn_file(low, "low")
+    print "Throughput: ", ingestion.get_stats()
+    print "Learned high tone patterns: ", ingestion.learn_file(high, "high")
+    for state, knowledge in ingestion.recognize_file(high):
+        print state, knowledge.get_class() if knowledge is not None else None
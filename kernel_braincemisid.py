@@ -1,8 +1,9 @@
 # Brain-CEMISID kernel imports
 from rel_network import RelKnowledge, RelNeuron, RelNetwork
+from rel_query import RelQueryEngine
 from analytical_neuron import AnalyticalNeuron
 from cultural_network import CulturalNetwork
-from sensory_neural_block import SensoryNeuralBlock, RbfKnowledge, RbfNeuron, RbfNetwork
+from sensory_neural_block import SensoryNeuralBlock, RbfKnowledge, RbfNeuron, RbfNetwork, RbfConfig
 from geometric_neural_block import GeometricNeuralBlock
 from internal_state import InternalState, BiologyCultureFeelings
 from episodic_memories import EpisodicMemoriesBlock
@@ -25,30 +26,33 @@ import os.path
 class KernelBrainCemisid:
 
     ## Kernel contructor
-    def __init__(self):
+    # @param seed Seed of the analytical neuron, which breaks ties between ambiguous relations at random.
+    #    None seeds it from the system
+    # @param decision_memory_count Integer. Maximum number of episodic memories taken into account to make a
+    #    decision (see EpisodicMemoriesBlock.retrieve_top_memories)
+    # @param decision_distance_weight Float. Score a memory loses, when ranked to make a decision, per unit of
+    #    Manhattan distance between its BCF and the desired state. The three BCF components lie in [0, 1], so with
+    #    the default a memory loses at most 0.3: distance breaks ties between memories that contain the same number
+    #    of short term inputs (a point each) without outweighing one more input
+    def __init__(self, seed=None, decision_memory_count=32, decision_distance_weight=0.1):
         grid_size = 16
         # HEURISTICS: radius = (1/3)*2^(ENCODING_SIZE)
         # where ENCODING_SIZE is bit size of every pattern element (8 bits for us)
         radius = 24
-        # Calculate pattern size based on grid_size and size of a Nibble (4)
-        pattern_size = pow(grid_size, 2) / 4
-        # Set neural network data size
-        RbfNetwork.PATTERN_SIZE = pattern_size
-        # Set neural network default radius
-        RbfNetwork.DEFAULT_RADIUS = radius
-        # Set pattern size in RBF knowledge
-        RbfKnowledge.PATTERN_SIZE = pattern_size
+        # Configuration of the sensory networks. Pattern size is based on grid_size and size of a Nibble (4)
+        self.rbf_config = RbfConfig.for_grid(grid_size, radius)
 
         # If there are no persisten memory related files, create them
         if not os.path.isfile("persistent_memory/sight_snb.p"):
             self.erase_all_knowledge()
 
         # SNB
-        self.snb = SensoryNeuralBlock("persistent_memory/sight_snb.p", "persistent_memory/hearing_snb.p")
+        self.snb = SensoryNeuralBlock("persistent_memory/sight_snb.p", "persistent_memory/hearing_snb.p",
+                                      self.rbf_config)
         # Relational Neural Block
         self.rnb = RelNetwork.deserialize("persistent_memory/rnb.p")
         # Analytical neuron
-        self.analytical_n = AnalyticalNeuron()
+        self.analytical_n = AnalyticalNeuron(seed)
         # Addition by memory network
         self.am_net = CulturalNetwork.deserialize("persistent_memory/am_net.p")
         # Geometric Neural Block
@@ -59,6 +63,8 @@ class KernelBrainCemisid:
         self.words_net = CulturalNetwork.deserialize("persistent_memory/words_net.p")
         # Sight-Syllables rel network
         self.ss_rnb = RelNetwork.deserialize("persistent_memory/ss_rnb.p")
+        # Query engine over both relational networks
+        self.rel_query = RelQueryEngine(self.rnb, self.ss_rnb)
 
         # ################### INTENTIONS MODULES ########################################################################
         self.episodic_memory = EpisodicMemoriesBlock.deserialize("persistent_memory/episodic_memory.p")
@@ -72,6 +78,10 @@ class KernelBrainCemisid:
 
         # Memory that stores short term bip inputs for making a decision
         self._intentions_short_term_memory = []
+        # Maximum number of memories taken into account to make a decision. Memories are ranked by the number of
+        # short term inputs they contain and, among those, by closeness of their BCF to the desired state
+        self.decision_memory_count = decision_memory_count
+        self.decision_distance_weight = decision_distance_weight
         self._output_memory = None
         # ###############################################################################################################
 
@@ -311,17 +321,15 @@ class KernelBrainCemisid:
     def _bip_words(self):
         # Get id of neuron that recognized sight pattern
         sight_id = self.snb.snb_s.get_rneurons_ids()[0]
-        # Get sight and hearing ids relationship from sight-hearing relational neural block
-        s_h_rels = self.rnb.get_sight_rels(sight_id)
-        # Get sight and syllables ids relationship from  sight-syllables relational neural block
-        s_syll_rels = self.ss_rnb.get_sight_rels(sight_id)
+        # Get hearing id and syllable id related to the sight id by the sight-hearing and
+        # sight-syllables relational neural blocks
+        hearing_id, syll_hearing_id = self.rel_query.resolve_sight(sight_id)
 
         # If at least one relationship was found between sight pattern and a hearing piece of
         # knowledge and the kernel is currently learning syllables, execute bip just in the
         # syllables net
-        if len(s_h_rels) != 0 and self._learning_syllables:
+        if hearing_id is not None and self._learning_syllables:
             # Syllables
-            hearing_id = s_h_rels[0].get_h_id()
             self.syllables_net.bip(hearing_id)
         # If no relation found, the kernel is not learning syllables but words
         else:
@@ -330,9 +338,8 @@ class KernelBrainCemisid:
         # If at least one relationship was found between sight pattern and a syllable
         # and the kernel is currently learning syllables, execute bip just in the
         # syllables net
-        if len(s_syll_rels) != 0 and self._learning_words:
+        if syll_hearing_id is not None and self._learning_words:
             self._bbcc_words = True
-            syll_hearing_id = s_syll_rels[0].get_h_id()
             self.words_net.bip(syll_hearing_id)
         # If no relation found, the kernel is not learning syllables but words
         else:
@@ -354,7 +361,7 @@ class KernelBrainCemisid:
             self.h_knowledge_out = []
             for digit_h_id in result:
                 self.h_knowledge_out.append(self.snb.get_hearing_knowledge(digit_h_id, True))
-                digit_s_id = self.rnb.get_hearing_rels(digit_h_id)[0].get_s_id()
+                digit_s_id = self.rel_query.get_hearing_sight(digit_h_id)
                 self.s_knowledge_out.append(self.snb.get_sight_knowledge(digit_s_id, True))
 
     ## Check if addition by memory network has a result related
@@ -377,15 +384,13 @@ class KernelBrainCemisid:
     def _check_words(self):
         # Get id of neuron that recognized sight pattern
         sight_id = self.snb.snb_s.get_rneurons_ids()[0]
-        # Get sight and hearing ids relationship from sight-hearing relational neural block
-        s_h_rels = self.rnb.get_sight_rels(sight_id)
-        # Get sight and syllables ids relationship from  sight-syllables relational neural block
-        s_syll_rels = self.ss_rnb.get_sight_rels(sight_id)
+        # Get hearing id and syllable id related to the sight id by the sight-hearing and
+        # sight-syllables relational neural blocks
+        hearing_id, syll_hearing_id = self.rel_query.resolve_sight(sight_id)
 
         # Syllables
-        if len(s_h_rels) != 0 and self._learning_syllables:
+        if hearing_id is not None and self._learning_syllables:
             # Syllables
-            hearing_id = s_h_rels[0].get_h_id()
             syll_id = self.syllables_net.check(hearing_id)
             # If syllables net does not have any knowledge related to the preceding bbc series, proceed with clack
             if syll_id is None:
@@ -394,7 +399,7 @@ class KernelBrainCemisid:
                 return
             self.state = "HIT"
             hearing_knowledge = self.syllables_net.get_tail_knowledge(syll_id)
-            sight_id = self.ss_rnb.get_hearing_rels(syll_id)[0].get_s_id()
+            sight_id = self.rel_query.get_syllable_sight(syll_id)
             self.s_knowledge_out = self.snb.get_sight_knowledge(sight_id, True)
             self.h_knowledge_out = hearing_knowledge
             self._enable_bbcc = False
@@ -403,8 +408,7 @@ class KernelBrainCemisid:
         self._learning_syllables = False
 
         # Words
-        if len(s_syll_rels) != 0 and self._learning_words:
-            syll_hearing_id = s_syll_rels[0].get_h_id()
+        if syll_hearing_id is not None and self._learning_words:
             word_id = self.words_net.check(syll_hearing_id)
             # If word net doesn't have any knowledge related to the preceding bbc series, proceed with clack
             if word_id is None:
@@ -420,10 +424,8 @@ class KernelBrainCemisid:
     def _get_hearing_id_recognize(self):
         # Obtain id of neuron that recognized sight pattern
         sight_id = self.snb.snb_s.get_rneurons_ids()[0]
-        # Obtain sight and hearing ids relationship from relational neural block
-        sight_rel = self.rnb.get_sight_rels(sight_id)[0]
-        # Get hearing id from relation
-        return sight_rel.get_h_id()
+        # Get hearing id related to the sight id by the relational neural block
+        return self.rel_query.get_sight_hearing(sight_id)
         # Esto puede ser puesto en un modulo de 'utility functions'
 
     @staticmethod
@@ -501,10 +503,11 @@ class KernelBrainCemisid:
             hearing_id = self.snb.snb_h.get_rneurons_ids()[0]
             # Get memory related to hearing id
             memory = self.episodic_memory.retrieve_exact_memory([hearing_id])
-            # Get bcf related to memory
-            memory_bcf = memory.get_tail_knowledge().get_state()
-            # Memory's bcf affects internal state
-            self.feed_internal_state(memory_bcf)
+            if memory is not None:
+                # Get bcf related to memory
+                memory_bcf = memory.get_tail_knowledge().get_state()
+                # Memory's bcf affects internal state
+                self.feed_internal_state(memory_bcf)
 
     ## Recognize sight pattern
     def sight_recognize(self):
@@ -513,10 +516,8 @@ class KernelBrainCemisid:
         if self.state == "HIT":
             # Obtain id of neuron that recognized sight pattern
             sight_id = self.snb.snb_s.get_rneurons_ids()[0]
-            # Obtain sight and hearing ids relationship from relational neural block
-            sight_rel = self.rnb.get_sight_rels(sight_id)[0]
-            # Get hearing id from relation
-            hearing_id = sight_rel.get_h_id()
+            # Get hearing id related to the sight id by the relational neural block
+            hearing_id = self.rel_query.get_sight_hearing(sight_id)
             # Put hearing knowledge in output port
             self.h_knowledge_out = self.snb.get_hearing_knowledge(hearing_id, True)
             # Put sight knowledge in output port
@@ -524,21 +525,19 @@ class KernelBrainCemisid:
             ################# INTENTIONS ###############################################################################
             # Get memory related to hearing id
             memory = self.episodic_memory.retrieve_exact_memory([hearing_id])
-            # Get bcf related to memory
-            memory_bcf = memory.get_tail_knowledge().get_state()
-            # Memory's bcf affects internal state
-            self.feed_internal_state(memory_bcf)
+            if memory is not None:
+                # Get bcf related to memory
+                memory_bcf = memory.get_tail_knowledge().get_state()
+                # Memory's bcf affects internal state
+                self.feed_internal_state(memory_bcf)
 
         elif self.state == "DIFF":
             # Get ids os sight neurons that recognized the pattern
             ids_recognize = self.snb.snb_s.get_rneurons_ids()
-            # Initialize a vector of relational knowledge
-            rel_knowledge_vector = []
-            # Fill the vector with the relational knowledge of neurons that recognized the pattern
-            for neuron_id in ids_recognize:
-                rel_knowledge_vector += self.rnb.get_sight_rels(neuron_id)
-            # Get hearing id from analytical neural block
-            hearing_id = self.analytical_n.solve_ambiguity(rel_knowledge_vector)
+            # All relations of neurons that recognized the pattern have been used
+            self.rnb.reinforce_sight_rels(ids_recognize)
+            # Get hearing id of the maximum weight relation of neurons that recognized the pattern
+            hearing_id = self.analytical_n.solve_ambiguity_sight(self.rnb, ids_recognize)
             # Sight knowledge
             sight_knowledge = RbfKnowledge(pattern, str(hearing_id))
             # Learn
@@ -565,16 +564,14 @@ class KernelBrainCemisid:
         self.feed_internal_state(self._internal_state_in)
         # New learned item and passed internal state should be related as an episode
         internal_state_in = InternalState(self._internal_state_in)
-        self.episodic_memory.bum()
-        self.episodic_memory.check(learned_ids[1])
-        self.episodic_memory.clack(internal_state_in)
+        self.episodic_memory.learn_sequence([learned_ids[1]], internal_state_in)
         EpisodicMemoriesBlock.serialize(self.episodic_memory, "persistent_memory/episodic_memory.p")
         ################################################################################################################
 
     ## Erase all knowlege. Get to a *tabula rasa* state.
     def erase_all_knowledge(self):
         # snb
-        self.snb = SensoryNeuralBlock()
+        self.snb = SensoryNeuralBlock(config=self.rbf_config)
         self.snb.save("persistent_memory/sight_snb.p", "persistent_memory/hearing_snb.p")
         # Relational Neural Block
         self.rnb = RelNetwork(100)
@@ -591,6 +588,7 @@ class KernelBrainCemisid:
         # Sight-Syllables rel network
         self.ss_rnb = RelNetwork(100)
         RelNetwork.serialize(self.ss_rnb, "persistent_memory/ss_rnb.p")
+        self.rel_query = RelQueryEngine(self.rnb, self.ss_rnb)
         # Geometric Neural Block
         self.gnb = GeometricNeuralBlock()
         GeometricNeuralBlock.serialize(self.gnb, "persistent_memory/gnb.p")
@@ -702,16 +700,17 @@ class KernelBrainCemisid:
     ## Pass check signal to intentions in order to make a decision
     def _check_intentions(self):
         # Get memories
-        memories = self.episodic_memory.retrieve_memories(self._intentions_short_term_memory)
+        memories = self.episodic_memory.retrieve_top_memories(self._intentions_short_term_memory,
+                                                              self.decision_memory_count,
+                                                              state=self.desired_state,
+                                                              distance_weight=self.decision_distance_weight)
         self.decisions_block.set_desired_state(self.desired_state)
         self.decisions_block.set_internal_state(self.internal_state)
         self.decisions_block.set_input_memories(memories)
         self._output_memory = self.decisions_block.get_output_memory()
-        # Obtain sight and hearing ids relationship from relational neural block
         hearing_id = self._output_memory.group[0].get_knowledge()
-        hearing_rel = self.rnb.get_hearing_rels(hearing_id)[0]
-        # Get hearing id from relation
-        sight_id = hearing_rel.get_s_id()
+        # Get sight id related to the hearing id by the relational neural block
+        sight_id = self.rel_query.get_hearing_sight(hearing_id)
         # Put hearing knowledge in output port
         self.h_knowledge_out = self.snb.get_hearing_knowledge(hearing_id, True)
         # Put sight knowledge in output port
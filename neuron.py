@@ -1,4 +1,56 @@
-class Neuron(object):
+import pickle
+
+
+## Base class of objects that store their attributes in __slots__ instead of a per-instance dictionary.
+# Neurons and pieces of knowledge are created by the hundreds of thousands, so the dictionary of every
+# instance would dominate memory use. The state is pickled as a dictionary, just as it was when these
+# classes had a __dict__, so files pickled by either version can be loaded by the other one.
+class SlottedObject(object):
+    __slots__ = ()
+
+    def __getstate__(self):
+        state = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        # Protocol 2 pickles of slotted objects store a (dict, slots) pair
+        if isinstance(state, tuple):
+            merged = {}
+            for part in state:
+                if part is not None:
+                    merged.update(part)
+            state = merged
+        for name in state:
+            setattr(self, name, state[name])
+
+
+## Unpickler that restores slotted objects pickled when their classes were classic classes. Pickle stores
+# classic instances without constructor arguments and, unlike for classic classes, calls the constructor
+# of new-style classes to restore them, which fails for constructors with required arguments
+class _Unpickler(pickle.Unpickler):
+
+    def _instantiate(self, klass, k):
+        if isinstance(klass, type) and issubclass(klass, SlottedObject) and len(self.stack) == k + 1:
+            del self.stack[k:]
+            self.append(klass.__new__(klass))
+        else:
+            pickle.Unpickler._instantiate(self, klass, k)
+
+
+## Load an object pickled in a file, including neurons and knowledge pickled when they were classic classes
+# @param pickle_file File opened for reading in binary mode
+# @retval obj Loaded object
+def load_pickle(pickle_file):
+    return _Unpickler(pickle_file).load()
+
+
+class Neuron(SlottedObject):
+    __slots__ = ("_has_knowledge", "_knowledge")
+
     def __init__(self, knowledge=None):
         if knowledge is None:
             self._has_knowledge = False
@@ -0,0 +1,135 @@
+import numpy as np
+
+from pattern_grid import decode_patterns, encode_grids, shift_grids
+from sensory_neural_block import RbfKnowledge
+
+## \defgroup PatternAugmentation Pattern augmentation related classes
+#
+# Pattern augmentation related classes generate noisy variants of learned
+# sight patterns for stress tests and robustness training
+# @{
+#
+
+
+## Generator of noisy variants of a set of sight patterns.
+# Every variant is made from a randomly chosen source pattern by applying, in this order, a small
+# translation, a thickening of the strokes, random cell flips and random noise on the elements
+# (nibbles) of the encoded pattern. All operations are applied to whole batches with NumPy.
+class PatternAugmenter:
+
+    ## The constructor
+    # @param patterns Vector of sight patterns (see pattern_grid for the encoding)
+    # @param seed Seed of the random generator, so that generated batches are reproducible
+    # @param max_shift Integer. Maximum translation in cells in each axis
+    # @param thicken_probability Float. Probability of thickening the strokes of a variant by one cell
+    # @param flip_probability Float. Probability of flipping every single cell
+    # @param nibble_probability Float. Probability of adding or subtracting one to every element of the pattern
+    def __init__(self, patterns, seed=None, max_shift=1, thicken_probability=0.2, flip_probability=0.01,
+                 nibble_probability=0.0):
+        self.patterns = np.asarray(patterns, dtype=np.int64)
+        self.grids = decode_patterns(self.patterns)
+        self.max_shift = max_shift
+        self.thicken_probability = thicken_probability
+        self.flip_probability = flip_probability
+        self.nibble_probability = nibble_probability
+        self._random = np.random.RandomState(seed)
+
+    ## Generate a batch of variants
+    # @param size Integer. Number of variants
+    # @retval variants, sources Integer array of shape (size, pattern_size) and integer vector with the index of the
+    # source pattern of every variant
+    def batch(self, size):
+        sources = self._random.randint(0, len(self.patterns), size)
+        grids = self.grids[sources]
+        grids = self._shift(grids)
+        grids = self._thicken(grids)
+        if self.flip_probability > 0:
+            # Draw the positions of flipped cells instead of one random number per cell
+            flips = np.zeros(grids.size, dtype=bool)
+            flip_count = self._random.binomial(grids.size, self.flip_probability)
+            flips[self._random.randint(0, grids.size, flip_count)] = True
+            grids ^= flips.reshape(grids.shape)
+        variants = encode_grids(grids)
+        if self.nibble_probability > 0:
+            noise = self._random.random_sample(variants.shape) < self.nibble_probability
+            signs = self._random.randint(0, 2, variants.shape) * 2 - 1
+            variants = np.clip(variants + noise * signs, 0, (1 << 4) - 1)
+        return variants, sources
+
+    ## Return a generator of batches of variants
+    # @param size Integer. Number of variants per batch
+    # @param count Integer. Number of batches, None for an endless stream
+    def batches(self, size, count=None):
+        generated = 0
+        while count is None or generated < count:
+            yield self.batch(size)
+            generated += 1
+
+    ## Return a generator of batches of RbfKnowledge variants, ready to be learned
+    # (for instance, with RbfNetwork.learn_many)
+    # @param classes Vector of classes, one per source pattern
+    # @param size Integer. Number of variants per batch
+    # @param count Integer. Number of batches, None for an endless stream
+    def knowledge_batches(self, classes, size, count=None):
+        for variants, sources in self.batches(size, count):
+            yield [RbfKnowledge(variant, classes[source]) for variant, source in zip(variants.tolist(), sources)]
+
+    def _shift(self, grids):
+        if self.max_shift <= 0:
+            return grids
+        side = 2 * self.max_shift + 1
+        offsets = self._random.randint(0, side * side, len(grids))
+        shifted = np.empty(grids.shape, dtype=bool)
+        # Group variants by offset so that every group is translated at once
+        for offset in np.unique(offsets):
+            selected = offsets == offset
+            rows, cols = offset // side - self.max_shift, offset % side - self.max_shift
+            shifted[selected] = shift_grids(grids[selected], rows, cols)
+        return shifted
+
+    def _thicken(self, grids):
+        if self.thicken_probability <= 0:
+            return grids
+        selected = self._random.random_sample(len(grids)) < self.thicken_probability
+        # Strokes grow one cell to the right or one cell down
+        down = self._random.randint(0, 2, len(grids)) == 1
+        grids = grids.copy()
+        for direction, (rows, cols) in ((False, (0, 1)), (True, (1, 0))):
+            group = selected & (down == direction)
+            grids[group] |= shift_grids(grids[group], rows, cols)
+        return grids
+
+## @}
+#
+
+# Tests
+if __name__ == '__main__':
+
+    import time
+
+    from sensory_neural_block import RbfNetwork, RbfConfig
+
+    bar = np.zeros((16, 16), dtype=bool)
+    bar[3:13, 7:9] = True
+    dash = np.zeros((16, 16), dtype=bool)
+    dash[7:9, 3:13] = True
+    augmenter = PatternAugmenter(encode_grids(np.array([bar, dash])), seed=7)
+
+    start = time.time()
+    for variants, sources in augmenter.batches(100000, 10):
+        pass
+    print "Generated 1000000 variants in ", time.time() - start, " seconds"
+
+    # Same seed, same variants
+    first = PatternAugmenter(augmenter.patterns, seed=3).batch(5)[0]
+    second = PatternAugmenter(augmenter.patterns, seed=3).batch(5)[0]
+    print "Reproducible: ", (first == second).all()
+
+    net = RbfNetwork(10, RbfConfig.for_grid(16, 24))
+    net.learn(RbfKnowledge(augmenter.patterns[0].tolist(), "i"))
+    net.learn(RbfKnowledge(augmenter.patterns[1].tolist(), "-"))
+    for knowledge_list in augmenter.knowledge_batches(["i", "-"], 100, 1):
+        states = [net.recognize(knowledge.get_pattern()) for knowledge in knowledge_list]
+        print "HIT rate over noisy variants: ", states.count("HIT") / float(len(states))
+        states = [net.recognize(knowledge.get_pattern(), 1) for knowledge in knowledge_list]
+        print "HIT rate over noisy variants, shift tolerant: ", states.count("HIT") / float(len(states))
@@ -0,0 +1,90 @@
+import numpy as np
+
+## \defgroup PatternGrid Pattern grid encoding
+#
+# Functions that convert square grids of cells into the nibble patterns used as RbfKnowledge
+# patterns, and back. The encoding is the same as the one made by the painter widget of the user
+# interface: cells are traversed from the bottom-right corner to the top-left corner and every
+# group of CODING_SIZE cells is stored as an integer whose least significant bit is the first cell.
+# @{
+#
+
+## Number of cells stored in every element of a pattern
+CODING_SIZE = 4
+
+
+## Encode a set of grids into patterns
+# @param grids Boolean array of shape (count, grid_size, grid_size) or (grid_size, grid_size).
+# Rows go from top to bottom and columns from left to right
+# @retval patterns Integer array of shape (count, grid_size*grid_size/CODING_SIZE)
+def encode_grids(grids):
+    grids = np.asarray(grids, dtype=bool)
+    single = grids.ndim == 2
+    if single:
+        grids = grids[np.newaxis]
+    count = grids.shape[0]
+    cells = grids.reshape(count, -1, CODING_SIZE)[:, ::-1, ::-1].astype(np.uint8)
+    patterns = np.zeros(cells.shape[:2], dtype=np.uint8)
+    for bit in range(CODING_SIZE):
+        patterns |= cells[:, :, bit] << bit
+    patterns = patterns.astype(np.int64)
+    if single:
+        return patterns[0]
+    return patterns
+
+
+## Decode a set of patterns into grids
+# @param patterns Integer array of shape (count, pattern_size) or (pattern_size,)
+# @retval grids Boolean array of shape (count, grid_size, grid_size)
+def decode_patterns(patterns):
+    patterns = np.asarray(patterns, dtype=np.int64)
+    single = patterns.ndim == 1
+    if single:
+        patterns = patterns[np.newaxis]
+    count = patterns.shape[0]
+    grid_size = get_grid_size(patterns.shape[1])
+    cells = (patterns[:, :, np.newaxis] >> np.arange(CODING_SIZE)) & 1
+    grids = cells.reshape(count, -1)[:, ::-1].reshape(count, grid_size, grid_size).astype(bool)
+    if single:
+        return grids[0]
+    return grids
+
+
+## Translate a set of grids by the same offset.
+# Cells moved out of the grids are lost and cells moved in are empty
+# @param grids Boolean array of shape (count, grid_size, grid_size)
+# @param rows Integer. Number of cells to move down (up if negative)
+# @param cols Integer. Number of cells to move right (left if negative)
+# @retval shifted Boolean array of shape (count, grid_size, grid_size)
+def shift_grids(grids, rows, cols):
+    grids = np.asarray(grids, dtype=bool)
+    size = grids.shape[-1]
+    shifted = np.zeros(grids.shape, dtype=bool)
+    if abs(rows) < size and abs(cols) < size:
+        shifted[..., max(rows, 0):size + min(rows, 0), max(cols, 0):size + min(cols, 0)] = \
+            grids[..., max(-rows, 0):size + min(-rows, 0), max(-cols, 0):size + min(-cols, 0)]
+    return shifted
+
+
+## Translate a grid by every offset up to a given number of cells in each direction.
+# @param grid Boolean array of shape (grid_size, grid_size)
+# @param max_shift Integer. Maximum number of cells of the translation in each axis
+# @retval grids Boolean array of shape ((2*max_shift+1)**2, grid_size, grid_size). The first grid is the given one
+def translate_grid(grid, max_shift):
+    grid = np.asarray(grid, dtype=bool)
+    offsets = [(0, 0)] + [(rows, cols) for rows in range(-max_shift, max_shift + 1)
+                          for cols in range(-max_shift, max_shift + 1) if (rows, cols) != (0, 0)]
+    return np.array([shift_grids(grid, rows, cols) for rows, cols in offsets])
+
+
+## Get size of the side of the grid encoded in a pattern
+# @param pattern_size Integer. Number of elements of the pattern
+# @retval grid_size Integer
+def get_grid_size(pattern_size):
+    grid_size = int(round((pattern_size * CODING_SIZE) ** 0.5))
+    if grid_size * grid_size != pattern_size * CODING_SIZE:
+        raise ValueError("pattern does not encode a square grid")
+    return grid_size
+
+## @}
+#
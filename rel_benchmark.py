@@ -0,0 +1,215 @@
+import copy
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from analytical_neuron import AnalyticalNeuron
+from rel_network import RelKnowledge, RelNetwork
+
+## \defgroup RelBenchmark Relational network benchmark
+#
+# Relational network benchmark measures how learning, lookups, ambiguity resolution and
+# persistence of relational networks scale with the number of relations
+# @{
+#
+
+
+## Benchmark of RelNetwork over synthetic bipartite relation sets.
+# Relations relate hearing ids to sight ids. In "uniform" sets both ids are drawn uniformly, so all ids have
+# about the same number of relations. In "power_law" sets the probability of sight id k is proportional to
+# (k + 1)^-exponent, so a few sight ids have most relations, as happens with very ambiguous glyphs. There are
+# about a quarter as many ids of each kind as relations. Lookups query learned ids drawn uniformly, so every
+# lookup is as likely to hit a rare id as a frequent one.
+#
+# For every distribution and size, the benchmark measures:
+# * "bulk_learn_time", "incremental_learn_time": seconds to learn all relations with RelNetwork.learn_many and
+#   one at a time with RelNetwork.learn
+# * "hearing_lookup_latency", "sight_lookup_latency": seconds per call of get_hearing_rels and get_sight_rels.
+#   These lookups reinforce the relations they return, as recorded by "lookups_reinforce", so they are timed on
+#   a copy of the network and the other measurements see the network as it was learned
+# * "ambiguity_latency": seconds per call of AnalyticalNeuron.solve_ambiguity_sight with several sight ids
+# * "pickle_size": bytes of the serialized network
+# * "save_time", "load_time", "csr_save_time", "csr_load_time": seconds to serialize and deserialize the
+#   network, and to save and load it as a compressed sparse row matrix
+class RelBenchmark:
+
+    ## Distributions of relation sets
+    DISTRIBUTIONS = ("uniform", "power_law")
+
+    ## The constructor
+    # @param seed Seed of the random generator, so that relation sets and queries are reproducible
+    # @param lookup_count Integer. Number of lookups and ambiguity resolutions timed per network
+    # @param ambiguity_size Integer. Number of sight ids given to every ambiguity resolution
+    # @param zipf_exponent Float. Exponent of the distribution of sight ids of power law sets
+    def __init__(self, seed=0, lookup_count=10000, ambiguity_size=3, zipf_exponent=1.2):
+        self.seed = seed
+        self.lookup_count = lookup_count
+        self.ambiguity_size = ambiguity_size
+        self.zipf_exponent = zipf_exponent
+
+    ## Build a synthetic relation set
+    # @param distribution "uniform" or "power_law"
+    # @param size Integer. Number of relations, some of which may be duplicates
+    # @retval relations Integer array of shape (size, 3) with (h_id, s_id, weight) rows
+    def make_relations(self, distribution, size):
+        generator = np.random.RandomState(self.seed)
+        id_count = max(size // 4, 1)
+        h_ids = generator.randint(0, id_count, size)
+        if distribution == "uniform":
+            s_ids = generator.randint(0, id_count, size)
+        elif distribution == "power_law":
+            probabilities = np.arange(1, id_count + 1) ** -float(self.zipf_exponent)
+            s_ids = generator.choice(id_count, size, p=probabilities / probabilities.sum())
+        else:
+            raise ValueError("unknown distribution " + str(distribution))
+        return np.column_stack((h_ids, s_ids, np.zeros(size, dtype=h_ids.dtype))).astype(RelNetwork.DTYPE)
+
+    ## Run the benchmark
+    # @param sizes Vector of numbers of relations
+    # @param distributions Vector of distributions, by default all of them
+    # @param incremental Boolean. Whether to time learning relations one at a time, which is slow for large sizes
+    # @retval results Vector of dictionaries, one per distribution and size, with "distribution", "size",
+    #    "relation_count" (relations learned, without duplicates) and the measurements
+    def run(self, sizes, distributions=None, incremental=True):
+        if distributions is None:
+            distributions = RelBenchmark.DISTRIBUTIONS
+        results = []
+        for distribution in distributions:
+            for size in sizes:
+                results.append(self.run_one(distribution, size, incremental))
+        return results
+
+    ## Run the benchmark with a single relation set
+    # @param distribution "uniform" or "power_law"
+    # @param size Integer. Number of relations
+    # @param incremental Boolean. Whether to time learning relations one at a time
+    # @retval result Dictionary
+    def run_one(self, distribution, size, incremental=True):
+        relations = self.make_relations(distribution, size)
+        result = {"distribution": distribution, "size": size}
+
+        start = time.time()
+        network = RelNetwork(1)
+        network.learn_many(relations)
+        result["bulk_learn_time"] = time.time() - start
+        result["relation_count"] = network.get_relation_count()
+
+        if incremental:
+            knowledge_list = [RelKnowledge(h_id, s_id, weight) for h_id, s_id, weight in relations.tolist()]
+            start = time.time()
+            incremental_network = RelNetwork(1)
+            for knowledge in knowledge_list:
+                incremental_network.learn(knowledge)
+            result["incremental_learn_time"] = time.time() - start
+        else:
+            result["incremental_learn_time"] = None
+
+        # Query learned ids, so that lookups find something
+        generator = np.random.RandomState(self.seed + 1)
+        h_ids = np.unique(relations[:, 0])
+        s_ids = np.unique(relations[:, 1])
+        lookup_network = copy.deepcopy(network)
+        result["lookups_reinforce"] = True
+        result["hearing_lookup_latency"] = _time_calls(
+            lookup_network.get_hearing_rels, h_ids[generator.randint(0, len(h_ids), self.lookup_count)].tolist())
+        result["sight_lookup_latency"] = _time_calls(
+            lookup_network.get_sight_rels, s_ids[generator.randint(0, len(s_ids), self.lookup_count)].tolist())
+        analytical_n = AnalyticalNeuron(self.seed)
+        sight_groups = s_ids[generator.randint(0, len(s_ids), (self.lookup_count, self.ambiguity_size))].tolist()
+        result["ambiguity_latency"] = _time_calls(lambda s_ids: analytical_n.solve_ambiguity_sight(network, s_ids),
+                                                  sight_groups)
+
+        result.update(_time_persistence(network))
+        return result
+
+    ## Format benchmark results as a text table
+    # @param results Vector returned by run()
+    # @retval table String
+    @staticmethod
+    def format_results(results):
+        lines = ["%-10s %9s %9s %10s %10s %11s %11s %11s %12s %8s %8s" % (
+            "dist", "size", "relations", "bulk (s)", "incr (s)", "hear (us)", "sight (us)", "ambig (us)",
+            "pickle (KB)", "save (s)", "load (s)")]
+        for result in results:
+            incremental = result["incremental_learn_time"]
+            lines.append("%-10s %9d %9d %10.3f %10s %11.2f %11.2f %11.2f %12.1f %8.3f %8.3f" % (
+                result["distribution"], result["size"], result["relation_count"], result["bulk_learn_time"],
+                "-" if incremental is None else "%.3f" % incremental, result["hearing_lookup_latency"] * 1e6,
+                result["sight_lookup_latency"] * 1e6, result["ambiguity_latency"] * 1e6,
+                result["pickle_size"] / 1024.0, result["save_time"], result["load_time"]))
+        return "\n".join(lines)
+
+    ## Save benchmark results as JSON, together with the versions of Python and NumPy, for regression tracking
+    # @param results Vector returned by run()
+    # @param name Name of the file
+    @staticmethod
+    def save_results(results, name):
+        report = {"python": platform.python_version(), "numpy": np.__version__, "time": time.time(),
+                  "results": results}
+        with open(name, "w") as results_file:
+            json.dump(report, results_file, indent=2, sort_keys=True)
+
+    ## Load benchmark results saved by save_results
+    # @param name Name of the file
+    # @retval results Vector of dictionaries
+    @staticmethod
+    def load_results(name):
+        with open(name) as results_file:
+            return json.load(results_file)["results"]
+
+
+## Call a function once per argument
+# @param function Function of one argument
+# @param arguments Vector
+# @retval latency Float. Mean seconds per call
+def _time_calls(function, arguments):
+    start = time.time()
+    for argument in arguments:
+        function(argument)
+    return (time.time() - start) / max(len(arguments), 1)
+
+
+## Measure persistence of a network in a temporary directory
+# @param network RelNetwork
+# @retval result Dictionary with "pickle_size", "save_time", "load_time", "csr_save_time" and "csr_load_time"
+def _time_persistence(network):
+    directory = tempfile.mkdtemp()
+    try:
+        name = os.path.join(directory, "rnb.p")
+        start = time.time()
+        RelNetwork.serialize(network, name)
+        result = {"save_time": time.time() - start, "pickle_size": os.path.getsize(name)}
+        start = time.time()
+        RelNetwork.deserialize(name)
+        result["load_time"] = time.time() - start
+        name = os.path.join(directory, "rnb")
+        start = time.time()
+        RelNetwork.save_csr(network, name)
+        result["csr_save_time"] = time.time() - start
+        start = time.time()
+        RelNetwork.from_csr(*RelNetwork.load_csr(name, None))
+        result["csr_load_time"] = time.time() - start
+        return result
+    finally:
+        shutil.rmtree(directory)
+
+## @}
+#
+
+# Tests
+if __name__ == '__main__':
+
+    import sys
+
+    # Usage: python rel_benchmark.py [max_exponent] [results.json]
+    max_exponent = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    benchmark = RelBenchmark()
+    results = benchmark.run([10 ** exponent for exponent in range(3, max_exponent + 1)])
+    print RelBenchmark.format_results(results)
+    if len(sys.argv) > 2:
+        RelBenchmark.save_results(results, sys.argv[2])
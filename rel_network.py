@@ -1,6 +1,15 @@
+import bisect
+import contextlib
+import functools
+import heapq
+import math
 import pickle
+import threading
+import time
 
-from neuron import Neuron
+import numpy as np
+
+from neuron import Neuron, SlottedObject, load_pickle
 
 ## \defgroup RelBlocks Relational network related classes
 #
@@ -13,10 +22,11 @@ from neuron import Neuron
 
 ## Relational knowledge is a 3-tuple that
 # relate a sight RbfNeuron id, a hearing RbfNeuron id and a  weight.
-class RelKnowledge:
+class RelKnowledge(SlottedObject):
+    __slots__ = ("_h_id", "_s_id", "_weight")
 
     ##  Create RelKnowledge instance given
-    # a hearing id (id_h), sight id (id_s) and weight which defaults to zero
+    # a hearing id (id_h), sight id (id_s) and weight which defaults to zero.
     def __init__(self, h_id, s_id, weight=0):
         self.set_h_id(h_id)
         self.set_s_id(s_id)
@@ -79,6 +89,7 @@ class RelKnowledge:
 
 ## Relational neuron
 class RelNeuron(Neuron):
+    __slots__ = ("_hit",)
 
     ## The constructor
     def __init__(self):
@@ -145,6 +156,24 @@ class RelNeuron(Neuron):
             return self._knowledge
         return None
 
+    ## Return knowledge stored by neuron if neuron has knowledge, and None object in any other case,
+    # without increasing the weight of the relation
+    # @retval knowledge RelKnowledge or None.
+    def read_knowledge(self):
+        return self._knowledge if self.has_knowledge() else None
+
+    ## Return hearing id if neuron has knowledge and None in any other case, without increasing the weight
+    # of the relation
+    # @retval h_id Integer or None. Hearing id.
+    def read_h_id(self):
+        return self._knowledge.get_h_id() if self.has_knowledge() else None
+
+    ## Return sight id if neuron has knowledge and None in any other case, without increasing the weight
+    # of the relation
+    # @retval s_id Integer or None. Sight id.
+    def read_s_id(self):
+        return self._knowledge.get_s_id() if self.has_knowledge() else None
+
     ##  Return weight of relation if neuron has knowledge and an object of type None in any other case
     # @retval weight Integer or None.
     def get_weight(self):
@@ -177,63 +206,908 @@ class RelNeuron(Neuron):
         return self._knowledge.is_equal(h_id, s_id)
 
 
-## Relational network
+## View of a relation stored by a RelNetwork.
+# It offers the interface of RelKnowledge, but reads and writes the columns of the network, so that
+# relations are not stored as one object each. Ids of learned relations cannot be changed.
+class RelKnowledgeView(object):
+    __slots__ = ("_network", "_index")
+
+    ## The constructor
+    # @param network RelNetwork
+    # @param index Integer. Index of the relation in the network
+    def __init__(self, network, index):
+        self._network = network
+        self._index = index
+
+    ## Get index of the relation in its network
+    # @retval index Integer
+    def get_index(self):
+        return self._index
+
+    def set_h_id(self, h_id):
+        raise AttributeError("ids of learned relations cannot be changed")
+
+    def set_s_id(self, s_id):
+        raise AttributeError("ids of learned relations cannot be changed")
+
+    ## Set weight
+    # @param w Integer. Weight.
+    def set_weight(self, w):
+        if w >= 0:
+            self._network.set_weight(self._index, w)
+        else:
+            raise ValueError("Invalid value for w")
+
+    ## Increase weight of relation by a given value
+    # @param amount Integer Optional, 1 by default
+    def increase_weight(self, amount=1):
+        self._network.increase_weights([self._index], amount)
+
+    ## Get hearing id of relation
+    # @retval h_id Integer. Hearing id.
+    def get_h_id(self):
+        return self._network._h_ids[self._index].item()
+
+    ## Get sight id of relation
+    # @retval s_id Integer. Sight id.
+    def get_s_id(self):
+        return self._network._s_ids[self._index].item()
+
+    ## Get weight of relation
+    # @retval weight Integer.
+    def get_weight(self):
+        return self._network.get_weight(self._index)
+
+    def is_equal_hearing(self, h_id):
+        return self.get_h_id() == h_id
+
+    def is_equal_sight(self, s_id):
+        return self.get_s_id() == s_id
+
+    def is_equal(self, h_id, s_id):
+        return self.get_h_id() == h_id and self.get_s_id() == s_id
+
+
+## Reader-writer lock. Any number of threads can hold it for reading at the same time, while a thread that
+# holds it for writing excludes all others. Writers take precedence: once a writer is waiting, new readers wait
+# for it, so a steady flow of readers cannot starve writers. The lock is reentrant: a thread that holds it can
+# acquire it again for reading, and a writer can acquire it again for writing, but a reader cannot upgrade to
+# writing. Every acquisition that had to wait is counted, so contention can be measured (see get_stats).
+class ReadWriteLock:
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        # Number of read acquisitions held by every thread and whether it counts as a reader
+        self._local = threading.local()
+        self.reset_stats()
+
+    ## Reset contention statistics
+    def reset_stats(self):
+        with self._condition:
+            self._stats = {"reads": 0, "writes": 0, "blocked_reads": 0, "blocked_writes": 0,
+                           "read_wait_time": 0.0, "write_wait_time": 0.0}
+
+    ## Get contention statistics
+    # @retval stats Dictionary. Numbers of read and write acquisitions ("reads", "writes"), numbers of them that
+    #    had to wait ("blocked_reads": readers stalled by writers, "blocked_writes") and seconds spent waiting
+    #    ("read_wait_time", "write_wait_time"). Reentrant acquisitions are not counted
+    def get_stats(self):
+        with self._condition:
+            return dict(self._stats)
+
+    def acquire_read(self):
+        local = self._local
+        depth = getattr(local, "reads", 0)
+        if depth == 0:
+            with self._condition:
+                # A writer reads without becoming a reader
+                local.reader = self._writer is not threading.current_thread()
+                if local.reader:
+                    self._stats["reads"] += 1
+                    if self._writer is not None or self._waiting_writers > 0:
+                        start = time.time()
+                        while self._writer is not None or self._waiting_writers > 0:
+                            self._condition.wait()
+                        self._stats["blocked_reads"] += 1
+                        self._stats["read_wait_time"] += time.time() - start
+                    self._readers += 1
+        local.reads = depth + 1
+
+    def release_read(self):
+        local = self._local
+        local.reads -= 1
+        if local.reads == 0 and local.reader:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.current_thread()
+        with self._condition:
+            if self._writer is me:
+                self._write_depth += 1
+                return
+            if getattr(self._local, "reads", 0) > 0 and self._local.reader:
+                raise RuntimeError("a read lock cannot be upgraded to a write lock")
+            self._stats["writes"] += 1
+            if self._writer is not None or self._readers > 0:
+                start = time.time()
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers > 0:
+                    self._condition.wait()
+                self._waiting_writers -= 1
+                self._stats["blocked_writes"] += 1
+                self._stats["write_wait_time"] += time.time() - start
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        with self._condition:
+            self._write_depth -= 1
+            if self._write_depth == 0:
+                self._writer = None
+                self._condition.notify_all()
+
+    ## Context manager that holds the lock for reading
+    @contextlib.contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    ## Context manager that holds the lock for writing
+    @contextlib.contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+## Decorator of RelNetwork methods that read the network. They hold its lock for reading if it has one
+def _reading(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        lock = self._lock
+        if lock is None:
+            return method(self, *args, **kwargs)
+        lock.acquire_read()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            lock.release_read()
+    return locked
+
+
+## Decorator of RelNetwork methods that change the network. They hold its lock for writing if it has one
+def _writing(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        lock = self._lock
+        if lock is None:
+            return method(self, *args, **kwargs)
+        lock.acquire_write()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            lock.release_write()
+    return locked
+
+
+## Relational network.
+# Relations are stored in three parallel NumPy arrays (hearing ids, sight ids and weights) that grow by
+# doubling their capacity, so a relation takes a few bytes instead of a RelNeuron and a RelKnowledge object.
+# Relations are returned as RelKnowledgeView instances, and the arrays can also be queried and updated in bulk.
+#
+# Relations are indexed by hearing id, by sight id and by pair of ids, so that looking up relations and
+# detecting duplicates take time proportional to the number of matching relations instead of the network size.
+# Ids must be integers, since they are stored in integer arrays. Networks that stored relations in RelNeuron
+# instances accepted any hashable id, such as strings; learn and learn_many now raise ValueError for them, so
+# such ids must be mapped to integers by the caller, and networks pickled with such ids cannot be loaded.
+#
+# Looking up relations with get_hearing_rels and get_sight_rels reinforces them (increases their weights by one).
+# read_hearing_rels and read_sight_rels never change the network. When reinforcement is deferred (see
+# set_deferred_reinforcement), uses of relations are recorded in a log instead, which is applied in batches by
+# apply_reinforcements: on demand, when the network is serialized, or periodically from a background thread
+# (see start_reinforcement_thread). Weights end up the same as if every use had been applied right away.
+#
+# The number of relations can be capped. Once the network is full, learning a relation evicts the relation of
+# least weight (the oldest one among those of least weight), whose slot is taken by the new relation. Relations
+# are kept in a heap ordered by weight and age, so an eviction takes amortized logarithmic time. Views of an
+# evicted relation show the relation that takes its slot.
+#
+# Weights can decay exponentially with time (see set_decay). Decay is lazy: every relation stores the time its
+# weight was last changed, and the decayed weight is calculated when it is read. Relations are compared by a key,
+# log(weight) + rate * time, that orders them as their decayed weights at any time, so that the relations of
+# maximum weight and the eviction heap do not need to be updated as time passes.
+#
+# A network can be shared by several threads once it is made concurrent (see set_concurrent). Methods that only
+# read it hold a ReadWriteLock for reading, so they run in parallel, and methods that change it hold the lock for
+# writing, so they run one at a time and weight updates are atomic. Looking up relations with get_hearing_rels or
+# get_sight_rels changes weights, so it is a write unless reinforcement is deferred, in which case it only adds an
+# entry to the reinforcement log and readers are not serialized. The lock counts how often readers were stalled by
+# writers (see get_contention_stats).
 class RelNetwork:
 
+    ## Type of the arrays of ids and weights
+    DTYPE = np.int64
+    ## Names of the arrays that store relations
+    COLUMNS = ("_h_ids", "_s_ids", "_weights", "_orders", "_stamps")
+
     ## The constructor
     # @param neuron_count Network size
-    def __init__(self, neuron_count):
-        # Create neuron list
-        self.neuron_list = []
-        # Fill neuron list with nre RelNeuron instances
-        for index in range(neuron_count):
-            self.neuron_list.append(RelNeuron())
-        # Index of ready to learn neuron
+    # @param max_relations Integer. Maximum number of relations, None for no limit
+    # @param concurrent Boolean. Whether the network is safe to share between threads (see set_concurrent)
+    def __init__(self, neuron_count, max_relations=None, concurrent=False):
+        if max_relations is not None:
+            neuron_count = min(neuron_count, max_relations)
+        self._h_ids = np.zeros(neuron_count, dtype=RelNetwork.DTYPE)
+        self._s_ids = np.zeros(neuron_count, dtype=RelNetwork.DTYPE)
+        self._weights = np.zeros(neuron_count, dtype=RelNetwork.DTYPE)
+        # Order in which relations were learned, used to evict the oldest relation among those of least weight
+        self._orders = np.zeros(neuron_count, dtype=RelNetwork.DTYPE)
+        # Time of the last change of every weight, used to decay weights
+        self._stamps = np.zeros(neuron_count, dtype=np.float64)
+        self._decay_rate = 0.0
+        self._clock = time.time
+        # Number of relations learned, which is also the index of the ready to learn neuron
         self._index_ready_to_learn = 0
+        # Number of relations ever learned, including evicted ones
+        self._learned_count = 0
+        self._eviction_count = 0
+        self._max_relations = None
+        self._lock = ReadWriteLock() if concurrent else None
+        self._build_indexes()
+        self._init_reinforcement()
+        self.set_max_relations(max_relations)
+
+    ## Serialize only the learned part of the arrays, with pending reinforcements included in the weights.
+    # The indexes are rebuilt when deserializing
+    @_reading
+    def __getstate__(self):
+        count = self._index_ready_to_learn
+        weights, stamps = self._get_final_weights()
+        return {"_h_ids": self._h_ids[:count], "_s_ids": self._s_ids[:count], "_weights": weights,
+                "_orders": self._orders[:count], "_stamps": stamps, "_index_ready_to_learn": count,
+                "_capacity": len(self._h_ids), "_learned_count": self._learned_count,
+                "_eviction_count": self._eviction_count, "_max_relations": self._max_relations,
+                "_decay_rate": self._decay_rate, "_clock": self._clock, "_concurrent": self._lock is not None}
+
+    ## Get weights of learned relations and times of their last changes as they will be once pending
+    # reinforcements are applied, without applying them
+    # @retval weights, stamps Arrays
+    def _get_final_weights(self):
+        count = self._index_ready_to_learn
+        weights = self._weights[:count]
+        stamps = self._stamps[:count]
+        with self._log_lock:
+            pending = list(self._reinforcement_log)
+        if len(pending) != 0:
+            weights = weights.copy()
+            stamps = stamps.copy()
+            for indexes, use_time in self._group_reinforcements(pending):
+                _add_weights(weights, stamps, *_sum_amounts(indexes, 1, weights.dtype),
+                             rate=self._decay_rate, use_time=use_time)
+        return weights, stamps
+
+    def __setstate__(self, state):
+        if "neuron_list" in state:
+            # Network serialized when relations were stored in RelNeuron instances
+            count = state["_index_ready_to_learn"]
+            knowledge = [neuron.read_knowledge() for neuron in state["neuron_list"][:count]]
+            state = {"_h_ids": [_check_id(element.get_h_id()) for element in knowledge],
+                     "_s_ids": [_check_id(element.get_s_id()) for element in knowledge],
+                     "_weights": [element.get_weight() for element in knowledge],
+                     "_index_ready_to_learn": count, "_capacity": len(state["neuron_list"])}
+        count = state["_index_ready_to_learn"]
+        if "_orders" not in state:
+            # Network serialized before relations could be evicted: relations were learned in index order
+            state = dict(state, _orders=np.arange(count), _learned_count=count, _eviction_count=0,
+                         _max_relations=None)
+        if "_stamps" not in state:
+            # Network serialized before weights could decay
+            state = dict(state, _stamps=np.zeros(count), _decay_rate=0.0, _clock=time.time)
+        capacity = max(state["_capacity"], count)
+        for name in RelNetwork.COLUMNS:
+            values = np.asarray(state[name])
+            # Weights are floats if they decayed
+            floats = name == "_stamps" or (name == "_weights" and values.dtype.kind == "f")
+            dtype = np.float64 if floats else RelNetwork.DTYPE
+            column = np.zeros(capacity, dtype=dtype)
+            column[:count] = values
+            setattr(self, name, column)
+        self._index_ready_to_learn = count
+        self._learned_count = state["_learned_count"]
+        self._eviction_count = state["_eviction_count"]
+        self._max_relations = state["_max_relations"]
+        self._decay_rate = state["_decay_rate"]
+        self._clock = state["_clock"]
+        self._lock = ReadWriteLock() if state.get("_concurrent", False) else None
+        self._build_indexes()
+        self._init_reinforcement()
+        self._build_priorities()
+
+    def _init_reinforcement(self):
+        self._deferred_reinforcement = False
+        # Log of uses of relations. Every element is a 2-tuple with an array of relation indexes and the time
+        # of their use (None if weights do not decay)
+        self._reinforcement_log = []
+        self._log_lock = threading.Lock()
+        self._reinforcement_thread = None
+        self._reinforcement_stop = None
+
+    ## Build the indexes of learned relations: relation indexes by hearing id and by sight id, the set of
+    # pairs of ids and the relations of maximum weight of every sight id
+    def _build_indexes(self):
+        self._hearing_index = {}
+        self._sight_index = {}
+        self._ids = set()
+        # Sight id -> (maximum weight, indexes of the relations of that sight id with that weight)
+        self._best_rels = {}
+        self._priorities = None
+        self._priority_keys = None
+        count = self._index_ready_to_learn
+        for index, h_id, s_id in zip(range(count), self._h_ids[:count].tolist(), self._s_ids[:count].tolist()):
+            self._add_to_indexes(index, h_id, s_id)
+
+    # Indexes of the relations of every id are kept in increasing order, which is the order of the neurons that
+    # stored them, also when an evicted or relocated relation takes a lower slot
+    def _add_to_indexes(self, index, h_id, s_id):
+        bisect.insort(self._hearing_index.setdefault(h_id, []), index)
+        bisect.insort(self._sight_index.setdefault(s_id, []), index)
+        self._ids.add((h_id, s_id))
+        self._weight_changed(index, s_id)
+
+    def _remove_from_indexes(self, index):
+        h_id = self._h_ids[index].item()
+        s_id = self._s_ids[index].item()
+        for id_index, key in ((self._hearing_index, h_id), (self._sight_index, s_id)):
+            indexes = id_index[key]
+            del indexes[bisect.bisect_left(indexes, index)]
+            if len(indexes) == 0:
+                del id_index[key]
+        self._ids.discard((h_id, s_id))
+        best = self._best_rels[s_id]
+        if index in best[1]:
+            best[1].remove(index)
+            if s_id not in self._sight_index:
+                del self._best_rels[s_id]
+            elif len(best[1]) == 0:
+                self._find_best(s_id)
+
+    ## Update the structures that depend on the weight of a relation after it changed
+    # @param index Integer. Index of the relation
+    # @param s_id Integer. Sight id of the relation
+    def _weight_changed(self, index, s_id):
+        self._update_best(index, s_id)
+        if self._priorities is not None:
+            key = self._get_weight_key(index)
+            keys = self._priority_keys
+            if index >= len(keys):
+                keys.extend([None] * (index + 1 - len(keys)))
+            keys[index] = key
+            heapq.heappush(self._priorities, (key, self._orders[index].item(), index))
+
+    ## Update the relations of maximum weight of a sight id after the weight of one of its relations changed
+    # @param index Integer. Index of the relation
+    # @param s_id Integer. Sight id of the relation
+    def _update_best(self, index, s_id):
+        weight = self._get_weight_key(index)
+        best = self._best_rels.get(s_id)
+        if best is None or weight > best[0]:
+            self._best_rels[s_id] = (weight, [index])
+        elif weight == best[0]:
+            position = bisect.bisect_left(best[1], index)
+            if position == len(best[1]) or best[1][position] != index:
+                best[1].insert(position, index)
+        elif index in best[1]:
+            best[1].remove(index)
+            if len(best[1]) == 0:
+                self._find_best(s_id)
+
+    def _find_best(self, s_id):
+        indexes = self._sight_index[s_id]
+        weights = self._get_weight_keys(indexes)
+        weight = weights.max()
+        self._best_rels[s_id] = (weight, sorted(indexes[position] for position in np.flatnonzero(weights == weight)))
+
+    ## Build the heap of relations used to choose the relation to be evicted when the number of relations is
+    # capped. Its elements are (weight key, order, index) tuples. When a weight changes, a new tuple is pushed and
+    # the old one becomes stale, which is detected when it reaches the top of the heap
+    def _build_priorities(self):
+        if self._max_relations is None:
+            self._priorities = None
+            self._priority_keys = None
+            return
+        count = self._index_ready_to_learn
+        # Current weight key of every relation in the heap
+        self._priority_keys = self._get_weight_keys(np.arange(count)).tolist()
+        self._priorities = list(zip(self._priority_keys, self._orders[:count].tolist(), range(count)))
+        heapq.heapify(self._priorities)
+
+    ## Set maximum number of relations. Relations are evicted at once if there are more
+    # @param max_relations Integer. Maximum number of relations, None for no limit
+    @_writing
+    def set_max_relations(self, max_relations):
+        if max_relations is not None and max_relations < 1:
+            raise ValueError("max_relations must be positive")
+        self._max_relations = max_relations
+        self._build_priorities()
+        if max_relations is None:
+            return
+        self.apply_reinforcements()
+        count = self._index_ready_to_learn
+        while count > max_relations:
+            # Move the last relation to the slot of the evicted one
+            index = self._evict()
+            count -= 1
+            if index != count:
+                h_id = self._h_ids[count].item()
+                s_id = self._s_ids[count].item()
+                self._remove_from_indexes(count)
+                for name in RelNetwork.COLUMNS:
+                    getattr(self, name)[index] = getattr(self, name)[count]
+                self._add_to_indexes(index, h_id, s_id)
+            self._index_ready_to_learn = count
+        self._build_priorities()
+
+    ## Get maximum number of relations
+    # @retval max_relations Integer or None
+    def get_max_relations(self):
+        return self._max_relations
+
+    ## Get number of relations evicted so far
+    # @retval count Integer
+    def get_eviction_count(self):
+        return self._eviction_count
+
+    ## Remove the relation of least weight (the oldest one among relations of least weight) from the indexes
+    # @retval index Integer. Index of the evicted relation, whose slot is free
+    def _evict(self):
+        priorities = self._priorities
+        # Rebuild the heap when most of its elements are stale
+        if len(priorities) > 2 * self._index_ready_to_learn + 16:
+            self._build_priorities()
+            priorities = self._priorities
+        while True:
+            weight, order, index = heapq.heappop(priorities)
+            if index < self._index_ready_to_learn and self._orders[index] == order and \
+                    self._priority_keys[index] == weight:
+                break
+        self._remove_from_indexes(index)
+        self._eviction_count += 1
+        return index
+
+    ## Get the slot of a new relation, evicting a relation if the network is full
+    # @retval index Integer
+    def _get_free_index(self):
+        if self._max_relations is not None and self._index_ready_to_learn >= self._max_relations:
+            # Pending reinforcements must be applied before relation indexes change
+            self.apply_reinforcements()
+            return self._evict()
+        index = self._index_ready_to_learn
+        self._reserve(index + 1)
+        self._index_ready_to_learn += 1
+        return index
+
+    ## Make room for a number of relations, doubling the capacity of the arrays as many times as needed
+    # @param count Integer. Number of relations to be stored in total
+    def _reserve(self, count):
+        capacity = len(self._h_ids)
+        if count <= capacity:
+            return
+        capacity = max(capacity, 1)
+        while capacity < count:
+            capacity *= 2
+        if self._max_relations is not None:
+            capacity = max(min(capacity, self._max_relations), count)
+        for name in RelNetwork.COLUMNS:
+            column = np.zeros(capacity, dtype=getattr(self, name).dtype)
+            column[:self._index_ready_to_learn] = getattr(self, name)[:self._index_ready_to_learn]
+            setattr(self, name, column)
 
     ##  Learn new knowledge in ready-to-learn neuron
-    # @param knowledge RelKnowledge to be learned.
+    # @param knowledge RelKnowledge to be learned. Its ids must be integers, otherwise ValueError is raised
+    # @retval learned Boolean. False if there already was a relation with the same ids
+    @_writing
     def learn(self, knowledge):
-        # If there is no capacity in neuron list, double size
-        if self._index_ready_to_learn == (len(self.neuron_list)-1):
-            new_list = []
-            # Fill neuron list with nre RelNeuron instances
-            for index in range(len(self.neuron_list)):
-                new_list.append(RelNeuron())
-            self.neuron_list = self.neuron_list + new_list
-        # Check for neurons that already have given knowledge ids
-        for index in range(self._index_ready_to_learn):
-            if self.neuron_list[index].has_ids(knowledge.get_h_id(), knowledge.get_s_id()):
-                return False
-        # If there are no neurons with given pair of ids, learn
-        self.neuron_list[self._index_ready_to_learn].learn(knowledge)
-        self._index_ready_to_learn += 1
+        h_id = _check_id(knowledge.get_h_id())
+        s_id = _check_id(knowledge.get_s_id())
+        # Check for relations that already have given knowledge ids
+        if (h_id, s_id) in self._ids:
+            return False
+        # If there are no relations with given pair of ids, learn
+        index = self._get_free_index()
+        self._h_ids[index] = h_id
+        self._s_ids[index] = s_id
+        self._weights[index] = knowledge.get_weight()
+        self._stamps[index] = self._get_time()
+        self._orders[index] = self._learned_count
+        self._learned_count += 1
+        self._add_to_indexes(index, h_id, s_id)
         return True
 
-    ## Return a list of all knowledge in net such that it has parameter h_id as hearing id
-    # @retval hearing_rels RelKnowledge vector
+    ## Learn many relations at once. The result is the same as learning them one after the other, but duplicates
+    # are detected in a single pass over the batch and the arrays grow once. If the batch may exceed the maximum
+    # number of relations, relations are learned one after the other so that evictions happen in the same order
+    # @param relations Iterable or integer array of (h_id, s_id, weight) triples. (h_id, s_id) pairs are learned
+    #    with weight 0. Ids must be integers, otherwise ValueError is raised
+    # @param weights Vector of weights, one per relation, used instead of those of relations. They can be floats,
+    #    as decayed weights are, in which case the network stores float weights from then on
+    # @retval learned, duplicates Integers. Number of new relations and number of relations whose ids were already
+    #    in the network or earlier in the batch
+    @_writing
+    def learn_many(self, relations, weights=None):
+        relations = np.asarray(relations if isinstance(relations, np.ndarray) else list(relations))
+        if relations.size == 0:
+            return 0, 0
+        if relations.ndim != 2 or relations.shape[1] not in (2, 3):
+            raise ValueError("relations must be (h_id, s_id, weight) triples")
+        if relations.dtype.kind not in "iu":
+            raise ValueError("ids must be integers")
+        h_ids = relations[:, 0].tolist()
+        s_ids = relations[:, 1].tolist()
+        if weights is not None:
+            weights = np.asarray(weights)
+            if weights.shape != (len(relations),):
+                raise ValueError("there must be one weight per relation")
+            if weights.dtype.kind == "f" and self._weights.dtype.kind != "f":
+                self._weights = self._weights.astype(np.float64)
+        elif relations.shape[1] == 3:
+            weights = relations[:, 2]
+        else:
+            weights = np.zeros(len(relations), dtype=RelNetwork.DTYPE)
+        if self._max_relations is not None and self._index_ready_to_learn + len(h_ids) > self._max_relations:
+            learned = 0
+            for h_id, s_id, weight in zip(h_ids, s_ids, weights.tolist()):
+                learned += self.learn(RelKnowledge(h_id, s_id, weight))
+            return learned, len(h_ids) - learned
+        # Keep the first relation of every pair of ids not learned yet
+        ids = self._ids
+        selected = []
+        for position in range(len(h_ids)):
+            pair = (h_ids[position], s_ids[position])
+            if pair not in ids:
+                ids.add(pair)
+                selected.append(position)
+        start = self._index_ready_to_learn
+        count = len(selected)
+        self._reserve(start + count)
+        selected = np.array(selected, dtype=np.intp)
+        self._h_ids[start:start + count] = relations[selected, 0]
+        self._s_ids[start:start + count] = relations[selected, 1]
+        self._weights[start:start + count] = weights[selected]
+        self._stamps[start:start + count] = self._get_time()
+        self._orders[start:start + count] = np.arange(self._learned_count, self._learned_count + count)
+        self._learned_count += count
+        self._index_ready_to_learn += count
+        for index, position in zip(range(start, start + count), selected.tolist()):
+            self._add_to_indexes(index, h_ids[position], s_ids[position])
+        return count, len(h_ids) - count
+
+    ## Return a list of all knowledge in net such that it has parameter h_id as hearing id.
+    # Every returned relation is reinforced, since it is being used
+    # @retval hearing_rels RelKnowledgeView vector
     def get_hearing_rels(self, h_id):
-        # List of hearing relations
-        hearing_rels = []
-        for index in range(self._index_ready_to_learn):
-            if self.neuron_list[index].recognize_hearing(h_id):
-                hearing_rels.append(self.neuron_list[index].get_knowledge())
-        return hearing_rels
+        return self._use_rels(self._hearing_index, [h_id])
 
     ## Return a list of all knowledge in net such that it has parameter s_id as sight id
-    # @retval sight_rels RelKnowledge vector
+    # Every returned relation is reinforced, since it is being used
+    # @retval sight_rels RelKnowledgeView vector
     def get_sight_rels(self, s_id):
-        # List of sight relations
-        sight_rels = []
-        for index in range(self._index_ready_to_learn):
-            if self.neuron_list[index].recognize_sight(s_id):
-                sight_rels.append(self.neuron_list[index].get_knowledge())
-        return sight_rels
+        return self._use_rels(self._sight_index, [s_id])
+
+    ## Reinforce all relations of the given ids of an index and return them. If the network is concurrent, the
+    # lookup and the reinforcement happen under the same lock, so indexes cannot change in between: it is held for
+    # reading if reinforcement is deferred, since only the reinforcement log changes, and for writing otherwise.
+    # The lock is taken once per lookup, unless reinforcement stops being deferred while waiting for it
+    # @param id_index Dictionary. Index of relations by hearing id or by sight id
+    # @param ids Integer vector
+    # @retval rels RelKnowledgeView vector
+    def _use_rels(self, id_index, ids):
+        lock = self._lock
+        if lock is None:
+            return self._use_indexed_rels(id_index, ids)
+        if self._deferred_reinforcement:
+            with lock.reading():
+                # Reinforcement may have stopped being deferred before the lock was held
+                if self._deferred_reinforcement:
+                    return self._use_indexed_rels(id_index, ids)
+        # Writers may reinforce whether reinforcement is deferred or not
+        with lock.writing():
+            return self._use_indexed_rels(id_index, ids)
+
+    def _use_indexed_rels(self, id_index, ids):
+        indexes = []
+        for key in ids:
+            indexes += id_index.get(key, [])
+        self.reinforce(indexes)
+        return [RelKnowledgeView(self, index) for index in indexes]
+
+    ## Return a list of all knowledge in net such that it has parameter h_id as hearing id, without
+    # reinforcing it
+    # @retval hearing_rels RelKnowledgeView vector
+    @_reading
+    def read_hearing_rels(self, h_id):
+        return [RelKnowledgeView(self, index) for index in self._hearing_index.get(h_id, ())]
+
+    ## Return a list of all knowledge in net such that it has parameter s_id as sight id, without
+    # reinforcing it
+    # @retval sight_rels RelKnowledgeView vector
+    @_reading
+    def read_sight_rels(self, s_id):
+        return [RelKnowledgeView(self, index) for index in self._sight_index.get(s_id, ())]
+
+    ## Reinforce relations that have been used, increasing their weights by one. When reinforcement is deferred
+    # the use is only recorded in the reinforcement log
+    # @param indexes Integer vector. Indexes of the relations, which may be repeated
+    def reinforce(self, indexes):
+        if len(indexes) == 0:
+            return
+        if self._deferred_reinforcement:
+            entry = (np.array(indexes, dtype=np.intp), self._get_time())
+            with self._log_lock:
+                self._reinforcement_log.append(entry)
+        else:
+            self.increase_weights(indexes)
+
+    ## Set whether reinforcement of used relations is deferred. Pending reinforcements are applied when
+    # reinforcement stops being deferred
+    # @param deferred Boolean
+    @_writing
+    def set_deferred_reinforcement(self, deferred):
+        self._deferred_reinforcement = deferred
+        if not deferred:
+            self.apply_reinforcements()
+
+    ## Apply all reinforcements recorded in the log
+    # @retval count Integer. Number of relation uses applied
+    @_writing
+    def apply_reinforcements(self):
+        with self._log_lock:
+            pending = self._reinforcement_log
+            self._reinforcement_log = []
+        count = 0
+        for indexes, use_time in self._group_reinforcements(pending):
+            self.increase_weights(indexes, 1, use_time)
+            count += len(indexes)
+        return count
+
+    ## Group entries of the reinforcement log that can be applied at once. Without decay all uses are applied
+    # together; with decay every use is applied at its own time
+    # @param pending Reinforcement log entries
+    # @retval groups Vector of 2-tuples (indexes, time)
+    def _group_reinforcements(self, pending):
+        if len(pending) == 0:
+            return []
+        if self._decay_rate == 0:
+            return [(np.concatenate([indexes for indexes, use_time in pending]), self._get_time())]
+        return pending
+
+    ## Get number of relation uses recorded in the reinforcement log and not applied yet
+    # @retval count Integer
+    def get_pending_reinforcements(self):
+        with self._log_lock:
+            return sum(len(indexes) for indexes, use_time in self._reinforcement_log)
+
+    ## Defer reinforcement and start a daemon thread that applies the reinforcement log periodically
+    # @param interval Float. Seconds between applications of the log
+    def start_reinforcement_thread(self, interval=1.0):
+        if self._reinforcement_thread is not None:
+            return
+        self.set_deferred_reinforcement(True)
+        self._reinforcement_stop = threading.Event()
+        self._reinforcement_thread = threading.Thread(target=self._run_reinforcement_thread,
+                                                      args=(interval, self._reinforcement_stop))
+        self._reinforcement_thread.daemon = True
+        self._reinforcement_thread.start()
+
+    ## Stop the thread started by start_reinforcement_thread and apply pending reinforcements. Reinforcement
+    # remains deferred
+    def stop_reinforcement_thread(self):
+        if self._reinforcement_thread is None:
+            return
+        self._reinforcement_stop.set()
+        self._reinforcement_thread.join()
+        self._reinforcement_thread = None
+        self._reinforcement_stop = None
+        self.apply_reinforcements()
+
+    def _run_reinforcement_thread(self, interval, stop):
+        while not stop.wait(interval):
+            self.apply_reinforcements()
+
+    ## Get a relation without increasing its weight
+    # @param index Integer. Index of the relation, less than get_relation_count()
+    # @retval relation RelKnowledgeView
+    def get_relation(self, index):
+        if not 0 <= index < self._index_ready_to_learn:
+            raise IndexError("relation index out of range")
+        return RelKnowledgeView(self, index)
+
+    ## Get number of relations learned
+    # @retval count Integer
+    def get_relation_count(self):
+        return self._index_ready_to_learn
+
+    ## Get the columns of learned relations. The arrays of ids are views of the storage of the network, so they
+    # must be copied if the network is to be changed while they are used. So is the array of weights, unless
+    # weights decay, in which case it is a new array with the current decayed weights. Concurrent networks
+    # return copies
+    # @retval h_ids, s_ids, weights Arrays
+    @_reading
+    def get_columns(self):
+        count = self._index_ready_to_learn
+        columns = (self._h_ids[:count], self._s_ids[:count],
+                   self._get_decayed(self._weights[:count], self._stamps[:count]))
+        if self._lock is not None:
+            columns = tuple(column.copy() for column in columns)
+        return columns
+
+    ## Set exponential decay of weights. A weight w changed at time t is worth w * exp(-rate * (now - t)). Current
+    # weights become the starting point of the new decay
+    # @param rate Float. Decay rate per unit of time of the clock, 0 for no decay
+    # @param clock Callable that returns the current time as a number, by default the one in use (time.time
+    #    unless changed). A LogicalClock gives deterministic results
+    @_writing
+    def set_decay(self, rate, clock=None):
+        if rate < 0:
+            raise ValueError("rate must not be negative")
+        self.apply_reinforcements()
+        count = self._index_ready_to_learn
+        weights = self._get_decayed(self._weights[:count], self._stamps[:count])
+        if rate != 0 and self._weights.dtype.kind != "f":
+            self._weights = self._weights.astype(np.float64)
+        self._weights[:count] = weights
+        self._decay_rate = float(rate)
+        if clock is not None:
+            self._clock = clock
+        self._stamps[:count] = self._get_time()
+        # Keys that order weights changed
+        for s_id in self._sight_index:
+            self._find_best(s_id)
+        self._build_priorities()
+
+    ## Get decay rate of weights
+    # @retval rate Float
+    def get_decay_rate(self):
+        return self._decay_rate
+
+    def _get_time(self):
+        return self._clock() if self._decay_rate != 0 else 0.0
+
+    def _get_decayed(self, weights, stamps):
+        if self._decay_rate == 0:
+            return weights
+        return weights * np.exp(-self._decay_rate * (self._get_time() - stamps))
+
+    ## Get current weight of a relation
+    # @param index Integer. Index of the relation
+    # @retval weight Integer, or Float if weights decay
+    @_reading
+    def get_weight(self, index):
+        weight = self._weights[index].item()
+        if self._decay_rate == 0:
+            return weight
+        return weight * np.exp(-self._decay_rate * (self._get_time() - self._stamps[index])).item()
+
+    ## Get a key that orders relations as their current weights, whatever the time
+    # @param index Integer. Index of the relation
+    # @retval key Number
+    @_reading
+    def get_weight_key(self, index):
+        return self._get_weight_key(index)
+
+    def _get_weight_key(self, index):
+        weight = self._weights[index].item()
+        if self._decay_rate == 0:
+            return weight
+        if weight <= 0:
+            return -np.inf
+        return math.log(weight) + self._decay_rate * self._stamps[index].item()
+
+    def _get_weight_keys(self, indexes):
+        weights = self._weights[indexes]
+        if self._decay_rate == 0:
+            return weights
+        keys = np.full(len(weights), -np.inf)
+        positive = weights > 0
+        keys[positive] = np.log(weights[positive]) + self._decay_rate * self._stamps[indexes][positive]
+        return keys
+
+    ## Get indexes of all relations whose hearing id is one of the given ones, without increasing their weights
+    # @param h_ids Integer vector
+    # @retval indexes Integer array, in increasing order
+    @_reading
+    def find_hearing_rels(self, h_ids):
+        return np.flatnonzero(np.isin(self._h_ids[:self._index_ready_to_learn], h_ids))
+
+    ## Get indexes of all relations whose sight id is one of the given ones, without increasing their weights
+    # @param s_ids Integer vector
+    # @retval indexes Integer array, in increasing order
+    @_reading
+    def find_sight_rels(self, s_ids):
+        return np.flatnonzero(np.isin(self._s_ids[:self._index_ready_to_learn], s_ids))
+
+    ## Increase weights of several relations at once. Amounts given for the same relation are added up,
+    # and, as in RelKnowledge.increase_weight, a weight is left unchanged if it would become negative
+    # @param indexes Integer vector. Indexes of relations, which may be repeated
+    # @param amounts Integer or Integer vector with one amount per index
+    # @param use_time Time of the increase if weights decay, by default the current time
+    @_writing
+    def increase_weights(self, indexes, amounts=1, use_time=None):
+        indexes = np.asarray(indexes, dtype=np.intp)
+        if len(indexes) == 0:
+            return
+        count = self._index_ready_to_learn
+        if indexes.min() < 0 or indexes.max() >= count:
+            raise IndexError("relation index out of range")
+        if use_time is None:
+            use_time = self._get_time()
+        changed = _add_weights(self._weights, self._stamps, *_sum_amounts(indexes, amounts, self._weights.dtype),
+                               rate=self._decay_rate, use_time=use_time)
+        for index, s_id in zip(changed.tolist(), self._s_ids[changed].tolist()):
+            self._weight_changed(index, s_id)
+
+    ## Set weight of a relation
+    # @param index Integer. Index of the relation
+    # @param weight Integer. Non negative weight
+    @_writing
+    def set_weight(self, index, weight):
+        if weight < 0:
+            raise ValueError("Invalid value for weight")
+        self._weights[index] = weight
+        self._stamps[index] = self._get_time()
+        self._weight_changed(index, self._s_ids[index].item())
+
+    ## Get the relations of maximum weight among all relations of a sight id, without reinforcing them
+    # @param s_id Integer. Sight id
+    # @retval best_rels RelKnowledgeView vector, in index order. Empty if there are no
+    #    relations of the sight id
+    @_reading
+    def get_best_sight_rels(self, s_id):
+        best = self._best_rels.get(s_id)
+        if best is None:
+            return []
+        return [RelKnowledgeView(self, index) for index in best[1]]
+
+    ## Reinforce all relations of the given sight ids
+    # @param s_ids Integer vector. Sight ids
+    def reinforce_sight_rels(self, s_ids):
+        self._use_rels(self._sight_index, s_ids)
+
+    ## Set whether the network is safe to share between threads. It must be set before the network is shared
+    # @param concurrent Boolean
+    def set_concurrent(self, concurrent):
+        if concurrent and self._lock is None:
+            self._lock = ReadWriteLock()
+        elif not concurrent:
+            self._lock = None
+
+    ## Get whether the network is safe to share between threads
+    # @retval concurrent Boolean
+    def is_concurrent(self):
+        return self._lock is not None
+
+    ## Get contention statistics of the lock of a concurrent network (see ReadWriteLock.get_stats)
+    # @retval stats Dictionary, None if the network is not concurrent
+    def get_contention_stats(self):
+        if self._lock is None:
+            return None
+        return self._lock.get_stats()
 
     ##  Returns number of neurons in network
     # @retval count Integer.
     def get_neuron_count(self):
-        return len(self.neuron_list)
+        return len(self._h_ids)
 
     @classmethod
     ## Serialize object and store it in given file
@@ -241,6 +1115,8 @@ class RelNetwork:
     # @param obj RelNetwork object to be serialized
     # @param name Name of the file where the serialization is to be stored
     def serialize(cls, obj, name):
+        # Serializing is a checkpoint: pending reinforcements are applied
+        obj.apply_reinforcements()
         pickle.dump(obj, open(name, "wb"))
 
     @classmethod
@@ -248,7 +1124,165 @@ class RelNetwork:
     # @param cls RelNetwork class
     # @param name Name of the file where the object is serialized
     def deserialize(cls, name):
-        return pickle.load(open(name, "rb"))
+        return load_pickle(open(name, "rb"))
+
+    ## Export relations as a compressed sparse row matrix. Row i holds the relations whose sight id (or hearing
+    # id) is i: their other ids are indices[indptr[i]:indptr[i+1]], in the order they were learned, and their
+    # weights are weights[indptr[i]:indptr[i+1]]. Pending reinforcements are included in the weights
+    # @param rows "sight" for rows indexed by sight id, "hearing" for rows indexed by hearing id
+    # @param row_count Integer. Number of rows, by default the maximum row id plus one
+    # @retval indptr, indices, weights Arrays. indptr and indices are integer arrays, weights is a float array if
+    #    weights decay or have decayed (see set_decay) and an integer array otherwise
+    @_reading
+    def to_csr(self, rows="sight", row_count=None):
+        h_ids, s_ids = self.get_columns()[:2]
+        weights = self._get_decayed(*self._get_final_weights())
+        row_ids, col_ids = _get_csr_ids(h_ids, s_ids, rows)
+        if len(row_ids) != 0 and row_ids.min() < 0:
+            raise ValueError("row ids must not be negative")
+        if row_count is None:
+            row_count = row_ids.max() + 1 if len(row_ids) != 0 else 0
+        counts = np.bincount(row_ids, minlength=row_count)
+        if len(counts) > row_count:
+            raise ValueError("row_count is less than the number of rows")
+        indptr = np.zeros(row_count + 1, dtype=RelNetwork.DTYPE)
+        np.cumsum(counts, out=indptr[1:])
+        # Relations of every row are kept in the order they were learned
+        order = np.lexsort((self._orders[:len(row_ids)], row_ids))
+        return indptr, col_ids[order], weights[order]
+
+    @classmethod
+    ## Create a network from a compressed sparse row matrix (see to_csr). Relations are learned row by row.
+    # Weights keep their type, so decayed weights are not truncated, but the network does not decay them
+    # @param cls RelNetwork class
+    # @param indptr, indices Integer arrays
+    # @param weights Integer or float array
+    # @param rows "sight" if rows are indexed by sight id, "hearing" if rows are indexed by hearing id
+    # @retval network RelNetwork
+    def from_csr(cls, indptr, indices, weights, rows="sight"):
+        indptr = np.asarray(indptr)
+        row_ids = np.repeat(np.arange(len(indptr) - 1, dtype=RelNetwork.DTYPE), np.diff(indptr))
+        # Row ids and column ids are the other way round
+        h_ids, s_ids = _get_csr_ids(row_ids, np.asarray(indices), rows)
+        network = cls(0)
+        network.learn_many(np.column_stack((h_ids, s_ids)).astype(RelNetwork.DTYPE), weights)
+        return network
+
+    @classmethod
+    ## Store the compressed sparse row matrix of a network (see to_csr) in three NumPy files, name + ".indptr.npy",
+    # name + ".indices.npy" and name + ".weights.npy", which can be memory mapped by load_csr
+    # @param cls RelNetwork class
+    # @param obj RelNetwork object to be stored
+    # @param name Prefix of the names of the files
+    # @param rows "sight" for rows indexed by sight id, "hearing" for rows indexed by hearing id
+    def save_csr(cls, obj, name, rows="sight"):
+        for suffix, array in zip(_CSR_SUFFIXES, obj.to_csr(rows)):
+            np.save(name + suffix, array)
+
+    @classmethod
+    ## Load a compressed sparse row matrix stored by save_csr. By default the arrays are memory mapped read-only,
+    # so several processes share them without copies. Use from_csr to create a network with them
+    # @param cls RelNetwork class
+    # @param name Prefix of the names of the files
+    # @param mmap_mode Memory mapping mode of numpy.load, None to read the arrays into memory
+    # @retval indptr, indices, weights Arrays, as returned by to_csr
+    def load_csr(cls, name, mmap_mode="r"):
+        return tuple(np.load(name + suffix, mmap_mode=mmap_mode) for suffix in _CSR_SUFFIXES)
+
+
+## Logical clock, whose time only advances when told to. Useful to decay weights deterministically
+class LogicalClock:
+
+    ## The constructor
+    # @param start Number. Initial time
+    def __init__(self, start=0):
+        self._time = start
+
+    ## Advance time
+    # @param steps Number. Units of time to advance
+    def tick(self, steps=1):
+        self._time += steps
+
+    ## Get current time
+    def __call__(self):
+        return self._time
+
+
+## Add up, for every relation, the amounts given for it
+# @param indexes Integer array. Indexes of relations, which may be repeated
+# @param amounts Number or vector with one amount per index
+# @param dtype Type of the totals
+# @retval indexes, totals Array of distinct indexes and array of the total amount of each of them
+def _sum_amounts(indexes, amounts, dtype):
+    indexes, inverse = np.unique(indexes, return_inverse=True)
+    totals = np.zeros(len(indexes), dtype=dtype)
+    np.add.at(totals, inverse, np.broadcast_to(np.asarray(amounts, dtype=dtype), inverse.shape))
+    return indexes, totals
+
+
+## Add amounts to weights in place, decaying them first. A weight is left unchanged if it would become negative
+# @param weights, stamps Arrays of weights and times of their last changes
+# @param indexes Integer array. Distinct indexes of the relations whose weights change
+# @param totals Array of amounts, one per index
+# @param rate Float. Decay rate
+# @param use_time Time of the addition
+# @retval changed Integer array. Indexes of the changed weights
+def _add_weights(weights, stamps, indexes, totals, rate, use_time):
+    changed = totals != 0
+    indexes = indexes[changed]
+    current = weights[indexes]
+    if rate != 0:
+        current = current * np.exp(-rate * (use_time - stamps[indexes]))
+    updated = current + totals[changed]
+    valid = updated >= 0
+    indexes = indexes[valid]
+    weights[indexes] = updated[valid]
+    stamps[indexes] = use_time
+    return indexes
+
+
+## Suffixes of the files written by RelNetwork.save_csr
+_CSR_SUFFIXES = (".indptr.npy", ".indices.npy", ".weights.npy")
+
+
+## Return row ids and column ids of relations for a compressed sparse row matrix
+# @param h_ids, s_ids Integer arrays
+# @param rows "sight" or "hearing"
+def _get_csr_ids(h_ids, s_ids, rows):
+    if rows == "sight":
+        return s_ids, h_ids
+    if rows == "hearing":
+        return h_ids, s_ids
+    raise ValueError("rows must be 'sight' or 'hearing'")
+
+
+## Get the number of relations of every row of a compressed sparse row matrix (see RelNetwork.to_csr)
+# @param indptr Integer array
+# @retval degrees Integer array
+def calc_degrees(indptr):
+    return np.diff(indptr)
+
+
+## Get the degree distribution of a compressed sparse row matrix (see RelNetwork.to_csr)
+# @param indptr Integer array
+# @retval distribution Integer array. distribution[d] is the number of rows with d relations
+def calc_degree_distribution(indptr):
+    return np.bincount(calc_degrees(indptr))
+
+
+## Get the rows of a compressed sparse row matrix with more than one relation (see RelNetwork.to_csr). With rows
+# indexed by sight id, they are the ambiguous sight ids: those related to several hearing ids
+# @param indptr Integer array
+# @retval row_ids Integer array
+def find_ambiguous_rows(indptr):
+    return np.flatnonzero(calc_degrees(indptr) > 1)
+
+
+## Return given id if it is an integer and raise ValueError in any other case
+def _check_id(value):
+    if isinstance(value, (int, long, np.integer)) and not isinstance(value, bool):
+        return int(value)
+    raise ValueError("ids must be integers")
 
 
 ## @}
@@ -283,7 +1317,7 @@ if __name__ == '__main__':
     print "Size ", net.get_neuron_count()
 
     # Create vector of knowledge
-    k = [RelKnowledge("1", 2, 5), RelKnowledge(1, 3, 5), RelKnowledge(2, 2), RelKnowledge(2, 3)]
+    k = [RelKnowledge(1, 2, 5), RelKnowledge(1, 3, 5), RelKnowledge(2, 2), RelKnowledge(2, 3)]
 
     # Learn and see how network size increases
     for e in k:
@@ -291,6 +1325,68 @@ if __name__ == '__main__':
         print "Size ", net.get_neuron_count()
 
     # Get all hearing relations with id == 1
-    for e in net.get_hearing_rels("1"):
+    for e in net.get_hearing_rels(1):
         print "Sight:", e.get_s_id()
         print "Weight: ", e.get_weight()
+
+    # Query and reinforce relations in bulk
+    indexes = net.find_sight_rels([2, 3])
+    print "Relations with sight ids 2 or 3: ", indexes.tolist()
+    net.increase_weights(indexes)
+    print "Weights: ", net.get_columns()[2].tolist()
+
+    # Learn relations in bulk
+    print "New and duplicate relations: ", net.learn_many([(1, 2, 0), (4, 4, 1), (4, 4, 3), (5, 4, 0)])
+
+    # Defer reinforcement of relations and apply it in a batch
+    net.set_deferred_reinforcement(True)
+    for e in net.get_sight_rels(4):
+        print "Sight 4, hearing:", e.get_h_id(), "weight: ", e.get_weight()
+    print "Pending reinforcements: ", net.get_pending_reinforcements()
+    net.apply_reinforcements()
+    print "Weights: ", net.get_columns()[2].tolist()
+
+    # Export as a sparse matrix of sight ids by hearing ids
+    indptr, indices, weights = net.to_csr()
+    print "CSR: ", indptr.tolist(), indices.tolist(), weights.tolist()
+    print "Degree distribution: ", calc_degree_distribution(indptr).tolist()
+    print "Ambiguous sight ids: ", find_ambiguous_rows(indptr).tolist()
+    print "Same relations after import: ", RelNetwork.from_csr(indptr, indices, weights).to_csr()[1].tolist()
+
+    # Cap the number of relations: relations of least weight are evicted
+    net.set_max_relations(4)
+    net.learn(RelKnowledge(7, 7))
+    print "Relations after learning in a full network: ", zip(*[column.tolist() for column in net.get_columns()])
+    print "Evictions: ", net.get_eviction_count()
+
+    # Relations of an id keep the order of their slots after evictions
+    capped = RelNetwork(1, max_relations=3)
+    capped.learn_many([(1, 8, 2), (2, 9, 0), (3, 8, 1)])
+    capped.learn(RelKnowledge(4, 8, 1))
+    order = [rel.get_index() for rel in capped.read_sight_rels(8)]
+    print "Sight 8, relation indexes: ", order, "sorted: ", order == sorted(order)
+
+    # Decay weights with a logical clock: weights halve every 10 ticks
+    clock = LogicalClock()
+    net.set_decay(np.log(2) / 10, clock)
+    clock.tick(10)
+    print "Weights after 10 ticks: ", net.get_columns()[2].tolist()
+
+    # Decayed weights are kept by a round trip through CSR files
+    import os, shutil, tempfile
+    directory = tempfile.mkdtemp()
+    RelNetwork.save_csr(net, os.path.join(directory, "rnb"))
+    loaded = RelNetwork.from_csr(*RelNetwork.load_csr(os.path.join(directory, "rnb"), None))
+    shutil.rmtree(directory)
+    print "Same weights after CSR round trip: ", np.array_equal(net.to_csr()[2], loaded.to_csr()[2])
+
+    # Share the network between threads: lookups with deferred reinforcement run in parallel
+    net.set_concurrent(True)
+    net.set_deferred_reinforcement(True)
+    lookups = [threading.Thread(target=net.get_sight_rels, args=(4,)) for i in range(4)]
+    for thread in lookups:
+        thread.start()
+    for thread in lookups:
+        thread.join()
+    print "Pending reinforcements after concurrent lookups: ", net.get_pending_reinforcements()
+    print "Contention: ", net.get_contention_stats()
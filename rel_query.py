@@ -0,0 +1,81 @@
+## \defgroup RelQuery Relational query engine
+#
+# The relational query engine follows chains of relations through the relational networks of the kernel
+# @{
+#
+
+
+## Query engine over the relational networks of the kernel: the sight-hearing network (rnb), which relates
+# hearing ids to sight ids, and the sight-syllables network (ss_rnb), which relates syllable ids to sight ids.
+# Every query follows the first relation of an id, as the kernel does, through RelNetwork.get_sight_rels or
+# RelNetwork.get_hearing_rels, so all relations of the id are reinforced and, if the network is concurrent,
+# looked up and reinforced under its lock
+class RelQueryEngine:
+
+    ## The constructor
+    # @param sight_hearing_net RelNetwork relating hearing ids to sight ids
+    # @param sight_syllable_net RelNetwork relating syllable ids to sight ids
+    def __init__(self, sight_hearing_net, sight_syllable_net):
+        self._sight_hearing_net = sight_hearing_net
+        self._sight_syllable_net = sight_syllable_net
+
+    ## Get the hearing id and the syllable id related to a sight id, reinforcing all relations of the sight id
+    # in both networks
+    # @param sight_id Integer
+    # @retval hearing_id, syllable_id Integers, None if the sight id has no relations in the corresponding network
+    def resolve_sight(self, sight_id):
+        hearing_rels = self._sight_hearing_net.get_sight_rels(sight_id)
+        syllable_rels = self._sight_syllable_net.get_sight_rels(sight_id)
+        return (hearing_rels[0].get_h_id() if hearing_rels else None,
+                syllable_rels[0].get_h_id() if syllable_rels else None)
+
+    ## Get the hearing id related to a sight id, reinforcing all sight-hearing relations of the sight id.
+    # Raises IndexError if the sight id has no relations
+    # @param sight_id Integer
+    # @retval hearing_id Integer
+    def get_sight_hearing(self, sight_id):
+        return self._sight_hearing_net.get_sight_rels(sight_id)[0].get_h_id()
+
+    ## Get the sight id related to a hearing id, reinforcing all sight-hearing relations of the hearing id.
+    # Raises IndexError if the hearing id has no relations
+    # @param hearing_id Integer
+    # @retval sight_id Integer
+    def get_hearing_sight(self, hearing_id):
+        return self._sight_hearing_net.get_hearing_rels(hearing_id)[0].get_s_id()
+
+    ## Get the sight id related to a syllable id, reinforcing all sight-syllable relations of the syllable id.
+    # Raises IndexError if the syllable id has no relations
+    # @param syllable_id Integer
+    # @retval sight_id Integer
+    def get_syllable_sight(self, syllable_id):
+        return self._sight_syllable_net.get_hearing_rels(syllable_id)[0].get_s_id()
+
+## @}
+#
+
+# Tests
+if __name__ == '__main__':
+
+    from rel_network import RelNetwork
+
+    rnb = RelNetwork(10)
+    rnb.learn_many([(0, 10), (1, 11), (2, 11)])
+    ss_rnb = RelNetwork(10)
+    ss_rnb.learn_many([(5, 11)])
+    engine = RelQueryEngine(rnb, ss_rnb)
+
+    print "Sight 11 (hearing, syllable): ", engine.resolve_sight(11)
+    print "Sight 10 (hearing, syllable): ", engine.resolve_sight(10)
+    print "Syllable 5, sight: ", engine.get_syllable_sight(5)
+    print "Hearing 2, sight: ", engine.get_hearing_sight(2)
+    print "Weights: ", rnb.get_columns()[2].tolist(), ss_rnb.get_columns()[2].tolist()
+
+    # New relations are seen at once
+    rnb.learn_many([(3, 12)])
+    print "Sight 12, hearing: ", engine.get_sight_hearing(12)
+
+    # Ids without relations
+    try:
+        engine.get_sight_hearing(13)
+    except IndexError:
+        print "Sight 13 has no relations"
@@ -0,0 +1,169 @@
+import random
+import time
+from multiprocessing import Pool
+
+from sensory_neural_block import SensoryNeuralBlock, RbfKnowledge, RbfConfig
+
+## \defgroup SensoryEvaluation Sensory evaluation related classes
+#
+# Sensory evaluation related classes measure how accuracy and latency of the
+# sensory neural block trade off as its parameters change
+# @{
+#
+
+
+## Cross-validated evaluation of sight recognition.
+# A labelled set of patterns is split into k folds. For every configuration and fold, a fresh
+# SensoryNeuralBlock learns the patterns of all other folds and then tries to recognize the
+# patterns of the fold. Folds run in a pool of processes.
+#
+# A configuration is a dictionary with any of the following keys:
+# * "radius": default radius of neurons (RbfConfig.default_radius)
+# * "min_radius", "max_radius": radius limits of neurons (RbfConfig.min_radius, RbfConfig.max_radius)
+# * "shift": cells of displacement tolerated in recognition (see RbfNetwork.recognize)
+# * "batch": True to learn with RbfNetwork.learn_many instead of one pattern at a time
+#
+# The Manhattan distance is the only metric implemented by RbfKnowledge, so it is not a parameter.
+class SensoryEvaluation:
+
+    ## Default values of configuration parameters
+    DEFAULT_CONFIGURATION = {"radius": 24, "min_radius": 1, "max_radius": 50, "shift": 0, "batch": False}
+
+    ## The constructor
+    # @param patterns Vector of sight patterns
+    # @param classes Vector of classes, one per pattern
+    # @param fold_count Integer. Number of folds
+    # @param seed Seed used to shuffle patterns before splitting them into folds
+    def __init__(self, patterns, classes, fold_count=5, seed=0):
+        if len(patterns) != len(classes):
+            raise ValueError("there must be one class per pattern")
+        if fold_count < 2 or fold_count > len(patterns):
+            raise ValueError("invalid number of folds")
+        self.patterns = [list(pattern) for pattern in patterns]
+        self.classes = list(classes)
+        indexes = list(range(len(patterns)))
+        random.Random(seed).shuffle(indexes)
+        ## @var folds
+        # List of folds. Every fold is a list of pattern indexes
+        self.folds = [indexes[fold::fold_count] for fold in range(fold_count)]
+
+    ## Evaluate a list of configurations
+    # @param configurations Vector of configuration dictionaries
+    # @param processes Integer. Number of processes, None to evaluate all folds in this process
+    # @retval results Vector of dictionaries, one per configuration, with the configuration and the mean over
+    # folds of "accuracy", "diff_rate", "miss_rate", "neuron_count" and "recognize_latency" (seconds per pattern)
+    def evaluate(self, configurations, processes=None):
+        configurations = [SensoryEvaluation.complete_configuration(configuration)
+                          for configuration in configurations]
+        jobs = []
+        for configuration in configurations:
+            for fold in range(len(self.folds)):
+                jobs.append((configuration, self._get_split(fold)))
+        if processes is None:
+            fold_results = [_evaluate_fold(job) for job in jobs]
+        else:
+            pool = Pool(processes)
+            try:
+                fold_results = pool.map(_evaluate_fold, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        results = []
+        fold_count = len(self.folds)
+        for index in range(len(configurations)):
+            current = fold_results[index*fold_count:(index+1)*fold_count]
+            result = {"configuration": configurations[index]}
+            for key in current[0]:
+                result[key] = sum(fold_result[key] for fold_result in current) / float(fold_count)
+            results.append(result)
+        return results
+
+    ## Return a configuration with all missing parameters set to their default values
+    # @param configuration Configuration dictionary
+    @staticmethod
+    def complete_configuration(configuration):
+        complete = dict(SensoryEvaluation.DEFAULT_CONFIGURATION)
+        for key in configuration:
+            if key not in complete:
+                raise ValueError("unknown configuration parameter " + str(key))
+            complete[key] = configuration[key]
+        return complete
+
+    ## Format evaluation results as a text table
+    # @param results Vector returned by evaluate()
+    # @retval table String
+    @staticmethod
+    def format_results(results):
+        lines = ["%-62s %8s %8s %8s %8s %12s" % ("configuration", "accuracy", "diff", "miss", "neurons",
+                                               "latency (ms)")]
+        for result in results:
+            configuration = result["configuration"]
+            description = ", ".join("%s=%s" % (key, configuration[key]) for key in sorted(configuration))
+            lines.append("%-62s %8.3f %8.3f %8.3f %8.1f %12.4f" % (
+                description, result["accuracy"], result["diff_rate"], result["miss_rate"],
+                result["neuron_count"], result["recognize_latency"] * 1000))
+        return "\n".join(lines)
+
+    def _get_split(self, test_fold):
+        train = []
+        for fold in range(len(self.folds)):
+            if fold != test_fold:
+                train += [(self.patterns[index], self.classes[index]) for index in self.folds[fold]]
+        test = [(self.patterns[index], self.classes[index]) for index in self.folds[test_fold]]
+        return train, test
+
+
+## Train a fresh SensoryNeuralBlock with a split and measure its recognition of the test patterns
+# @param job 2-tuple (configuration, (train, test)) where train and test are vectors of (pattern, class)
+# @retval result Dictionary of metrics
+def _evaluate_fold(job):
+    configuration, (train, test) = job
+    config = RbfConfig(len(train[0][0]), configuration["radius"], configuration["min_radius"],
+                       configuration["max_radius"])
+    snb = SensoryNeuralBlock(config=config)
+    knowledge_list = [RbfKnowledge(pattern, rbf_class) for pattern, rbf_class in train]
+    if configuration["batch"]:
+        snb.snb_s.learn_many(knowledge_list)
+    else:
+        for knowledge in knowledge_list:
+            snb.learn_sight(knowledge)
+    hits = 0
+    diffs = 0
+    misses = 0
+    start = time.time()
+    for pattern, rbf_class in test:
+        state = snb.recognize_sight(pattern, configuration["shift"])
+        if state == "HIT":
+            if snb.snb_s.get_knowledge().get_class() == rbf_class:
+                hits += 1
+        elif state == "DIFF":
+            diffs += 1
+        else:
+            misses += 1
+    latency = (time.time() - start) / max(len(test), 1)
+    count = float(max(len(test), 1))
+    return {"accuracy": hits / count, "diff_rate": diffs / count, "miss_rate": misses / count,
+            "neuron_count": snb.snb_s.get_index_ready_to_learn(), "recognize_latency": latency}
+
+## @}
+#
+
+# Tests
+if __name__ == '__main__':
+
+    # Synthetic data set: noisy copies of random prototypes
+    generator = random.Random(1)
+    prototypes = [[generator.randint(0, 15) for index in range(64)] for rbf_class in range(10)]
+    patterns = []
+    classes = []
+    for sample in range(200):
+        rbf_class = generator.randrange(10)
+        pattern = list(prototypes[rbf_class])
+        for index in generator.sample(range(64), 3):
+            pattern[index] = min(15, max(0, pattern[index] + generator.choice([-2, 2])))
+        patterns.append(pattern)
+        classes.append(str(rbf_class))
+
+    evaluation = SensoryEvaluation(patterns, classes, fold_count=5)
+    configurations = [{"radius": radius, "batch": batch} for radius in (10, 24, 40) for batch in (False, True)]
+    print SensoryEvaluation.format_results(evaluation.evaluate(configurations, processes=4))